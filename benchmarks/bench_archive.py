@@ -0,0 +1,71 @@
+# Hourly archive of WWO payloads: decoding and derivation times, size per station-year and check of derived
+# results against per-day parsing of the payloads
+#
+# Usage (from repository root):
+#   python -m benchmarks.bench_archive [--stations 5] [--years 10]
+
+import argparse
+import datetime
+import tempfile
+import time
+
+import numpy as np
+
+from src.my_archive import HourlyArchive
+from benchmarks.stub_wwo import make_wwo_day
+
+
+# Function for parsing daily results of single WWO day (per-day parsing of the raw payload, for comparison)
+def parse_day(wwo_day):
+    hourly = wwo_day['hourly']
+    at = {k['time']: k for k in hourly}
+    return {'min_temp': float(wwo_day['mintempC']), 'max_temp': float(wwo_day['maxtempC']),
+            'rain': round(sum([float(k['precipMM']) for k in hourly]), 1), 'sun': float(wwo_day['sunHour']),
+            'wind': max([float(k['windspeedKmph']) for k in hourly]),
+            'temp_9': float(at['900']['tempC']), 'temp_3': float(at['1500']['tempC']),
+            'hum_9': float(at['900']['humidity']), 'hum_3': float(at['1500']['humidity'])}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the hourly archive of WWO payloads.')
+    arg_parser.add_argument('--stations', type=int, default=5)
+    arg_parser.add_argument('--years', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    cities = ['Station %d' % k for k in range(args.stations)]
+    dates = [datetime.date(1990, 1, 1) + datetime.timedelta(days=k) for k in range(365 * args.years)]
+    payloads = {city: [make_wwo_day(city, dt) for dt in dates] for city in cities}
+
+    start = time.perf_counter()
+    expected = {city: {d['date']: parse_day(d) for d in payloads[city]} for city in cities}
+    print('per-day parsing     %.3f s' % (time.perf_counter() - start))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = HourlyArchive(tmp)
+
+        # Payloads are appended per month (as downloaded by range requests):
+        start = time.perf_counter()
+        results = {city: {} for city in cities}
+        for city in cities:
+            for k in range(0, len(dates), 30):
+                rows = archive.add_days(city, payloads[city][k:k + 30])
+                results[city].update(archive.results(city, rows))
+        print('archive and derive  %.3f s' % (time.perf_counter() - start))
+        print('identical results:', results == expected)
+
+        # Daily features of all archived days (from files, without network):
+        archive = HourlyArchive(tmp)
+        start = time.perf_counter()
+        frames = {city: archive.daily_frame(city) for city in archive.cities()}
+        print('features (offline)  %.3f s (%d days, %d columns)' %
+              (time.perf_counter() - start, sum(len(df) for df in frames.values()), frames[cities[0]].shape[1]))
+
+        size = sum(archive.daily[city].values.nbytes + archive.hourly[city].values.nbytes for city in cities)
+        print('archive size        %.1f kB per station-year' % (size / 1024 / args.stations / args.years))
+        print(frames[cities[0]][['cloud_9', 'cloud_3', 'wind_mean', 'precip_max', 'wet_hours']].describe()
+              .round(2).to_string())
+        print('missing values:', int(np.isnan(frames[cities[0]].values).sum()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Benchmark of package startup time (with 'python -X importtime')
+#
+# Usage (from repository root):
+#   python -m benchmarks.bench_imports [--repeat 5] [--top 10] [--output imports.json] [--baseline imports.json]
+
+import argparse
+import json
+import subprocess
+import sys
+
+# Measured startup targets (Python statements, executed in a fresh interpreter):
+TARGETS = {'analyzer': 'import src.my_analyzer',
+           'parser': 'import src.my_parser',
+           'pipeline': 'import src.my_pipeline',
+           'plotter': 'import src.my_plotter',
+           'cli': 'import runpy, sys; sys.argv = ["main.py", "--help"]; runpy.run_path("main.py")',
+           'plotting stack': 'import src.my_plotter; src.my_plotter.import_plotting("Agg")'}
+
+
+# Function for measuring imports of single statement (in a fresh interpreter)
+def measure(statement, exclude=()):
+    # statement - measured Python statement
+    # exclude   - ignored modules (e.g. imported at interpreter startup)
+    #
+    # Returns total import time [s] and dictionary mapping top-level imported modules to cumulative times [s]
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # Line format: 'import time: <self [us]> | <cumulative [us]> | <indented module name>'
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only top-level imports (nested ones are included in cumulative times):
+        if not name.startswith('  ') and name.strip() not in exclude:
+            modules[name.strip()] = modules.get(name.strip(), 0) + int(cumulative) / 1e6
+
+    return sum(modules.values()), modules
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Measure import time of package modules.')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='number of measurements (minimum is reported)')
+    arg_parser.add_argument('--top', type=int, default=10, help='number of listed slowest top-level imports')
+    arg_parser.add_argument('--output', help='save results to JSON file')
+    arg_parser.add_argument('--baseline', help='compare results with saved JSON file')
+    args = arg_parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Modules imported by the bare interpreter are not counted:
+    startup = set(measure('pass')[1])
+
+    results = {}
+    for target, statement in TARGETS.items():
+        runs = [measure(statement, startup) for _ in range(args.repeat)]
+        total, modules = min(runs, key=lambda run: run[0])
+        results[target] = total
+
+        line = '%-15s %8.3f s' % (target, total)
+        if target in baseline:
+            line += '  (baseline %.3f s, %5.2fx)' % (baseline[target], total / baseline[target])
+        print(line)
+        for name in sorted(modules, key=modules.get, reverse=True)[:args.top]:
+            print('    %-30s %8.3f s' % (name, modules[name]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
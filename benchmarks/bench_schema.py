@@ -0,0 +1,52 @@
+# Memory report of the compact schema (per station-year), with round trip and scoring checks
+#
+# Usage (from repository root):
+#   python -m benchmarks.bench_schema [--stations 50] [--years 30] [--mode int16]
+
+import argparse
+
+import numpy as np
+
+from src.my_parser import Parser
+from src.my_analyzer import Analyzer
+from src.my_schema import CompactSchema
+from benchmarks.synthetic import make_stations
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare memory of regular and compact parsed DFs.')
+    arg_parser.add_argument('--stations', type=int, default=50)
+    arg_parser.add_argument('--years', type=float, default=30)
+    arg_parser.add_argument('--missing', type=float, default=0.01)
+    arg_parser.add_argument('--mode', choices=['int16', 'float32'], default='int16')
+    args = arg_parser.parse_args()
+
+    names, latitudes, _, sheets = make_stations(args.stations, args.years, args.missing)
+    dfs = {name: Parser.derive_df(sheets[name], lat) for name, lat in zip(names, latitudes)}
+
+    schema = CompactSchema(args.mode)
+    print(schema.validate(dfs[names[0]]))
+
+    compact = schema.compact_dfs(dfs)
+    report = schema.memory_report(dfs, compact)
+    print(report.tail(3).to_string(float_format=lambda x: '%.1f' % x))
+
+    # Scores of compact DFs (uint8) must match scores of regular DFs:
+    regular, compacted = Analyzer(), Analyzer(compact=True)
+    regular_scores = regular.score_batch(dfs).score.values
+    compact_scores = compacted.score_batch(compact).score.values
+    print('identical scores:', np.array_equal(regular_scores, compact_scores))
+
+    # The same with limits lying exactly on observed (one-decimal) values of derived columns:
+    df = dfs[names[0]]
+    for analyzer in (regular, compacted):
+        analyzer.dew_1 = {'min': round(np.nanpercentile(df.dew_9, 25), 1), 'max': round(np.nanmedian(df.dew_3), 1)}
+        analyzer.sun_1 = {'min': round(np.nanmedian(df.sun_perc), 1)}
+    regular_scores = regular.score_batch(dfs).score.values
+    compact_scores = compacted.score_batch(compact).score.values
+    print('identical scores (boundary limits %s, %s):' % (regular.dew_1, regular.sun_1),
+          np.array_equal(regular_scores, compact_scores))
+
+
+if __name__ == '__main__':
+    main()
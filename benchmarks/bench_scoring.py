@@ -0,0 +1,82 @@
+# Benchmark of the fused comfort scoring kernel against the per-criterion DataFrame implementation
+#
+# Usage (from repository root):
+#   python -m benchmarks.bench_scoring [--rows 10000000]
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.my_analyzer import Analyzer
+import src.my_analyzer
+
+
+# Function for generating random parsed DF (realistic value ranges, with some missing values)
+def make_scoring_df(n_rows, nan_rate=0.01, seed=0):
+    rng = np.random.RandomState(seed)
+    min_temp = rng.normal(14, 6, n_rows).round(1)
+    data = {'min_temp': min_temp,
+            'max_temp': (min_temp + rng.gamma(4, 2.5, n_rows)).round(1),
+            'temp_9': (min_temp + rng.uniform(0, 8, n_rows)).round(1),
+            'temp_3': (min_temp + rng.uniform(2, 14, n_rows)).round(1),
+            'dew_9': rng.normal(10, 5, n_rows).round(1),
+            'dew_3': rng.normal(10, 5, n_rows).round(1),
+            'sun_perc': rng.uniform(0, 100, n_rows).round(1),
+            'rain': (rng.exponential(2, n_rows) * (rng.uniform(size=n_rows) < 0.4)).round(1),
+            'wind': rng.gamma(6, 6, n_rows).round(0)}
+    for col in data:
+        data[col][rng.uniform(size=n_rows) < nan_rate] = np.nan
+    return pd.DataFrame(data, index=pd.RangeIndex(n_rows))
+
+
+# Function with the per-criterion DataFrame implementation (reference for correctness and speed)
+def apply_criterion_reference(analyzer, df):
+    crit = pd.DataFrame(data={'temp': analyzer.temp_criterion(df), 'dew': analyzer.dew_criterion(df),
+                              'sun': analyzer.sun_criterion(df), 'rain': analyzer.rain_criterion(df),
+                              'wind': analyzer.wind_criterion(df)})
+    x = ((crit.sum(axis=1) > (3 * 2 + 2 * 1)) & ((crit == 0).sum(axis=1) == 0)) * 1
+    x += ((crit.sum(axis=1) > (4 * 1)) & ((crit == 0).sum(axis=1) <= 1)) * 1
+    return x
+
+
+# Function for timing single call (best of n_repeat runs)
+def best_time(func, n_repeat):
+    times = []
+    for _ in range(n_repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare fused and per-criterion comfort scoring.')
+    arg_parser.add_argument('--rows', type=int, default=10000000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    analyzer = Analyzer()
+    df = make_scoring_df(args.rows)
+
+    ref_time, ref = best_time(lambda: apply_criterion_reference(analyzer, df), args.repeat)
+    print('%-22s %8.3f s %10.1f Mrows/s' % ('per-criterion', ref_time, args.rows / ref_time / 1e6))
+
+    backends = [('fused (numpy)', None)]
+    if src.my_analyzer.numexpr is not None:
+        backends.append(('fused (numexpr)', src.my_analyzer.numexpr))
+
+    for label, backend in backends:
+        saved, src.my_analyzer.numexpr = src.my_analyzer.numexpr, backend
+        try:
+            fused_time, fused = best_time(lambda: analyzer.apply_criterion(df), args.repeat)
+        finally:
+            src.my_analyzer.numexpr = saved
+        identical = fused.dtype == ref.dtype and np.array_equal(fused.values, ref.values)
+        print('%-22s %8.3f s %10.1f Mrows/s  speedup %5.1fx  identical: %s' %
+              (label, fused_time, args.rows / fused_time / 1e6, ref_time / fused_time, identical))
+
+
+if __name__ == '__main__':
+    main()
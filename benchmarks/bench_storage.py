@@ -0,0 +1,70 @@
+# Benchmark of parsed data storage formats (load time and peak memory)
+#
+# Usage (from repository root):
+#   python -m benchmarks.bench_storage [--years 30] [--cities 5]
+
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.my_storage import get_storage
+
+
+# Function for generating random parsed DFs (same columns as Parser.parse_data output)
+def make_parsed_dfs(n_cities, n_years, seed=0):
+    rng = np.random.RandomState(seed)
+    index = pd.date_range('1990-01-01', periods=int(n_years * 365.25), name='Date')
+    columns = ['min_temp', 'max_temp', 'rain', 'sun', 'wind', 'temp_9', 'hum_9', 'temp_3', 'hum_3',
+               'dew_9', 'dew_3', 'sun_perc']
+    return {'City_' + str(k): pd.DataFrame(rng.uniform(0, 40, (len(index), len(columns))).round(1),
+                                           index=index, columns=columns)
+            for k in range(n_cities)}
+
+
+# Function for measuring single load (executed in a fresh process, to isolate peak RSS)
+def measure_load(fmt, path, columns, queue):
+    storage = get_storage(fmt, path)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    dfs = storage.load(columns=columns)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (rss_after - rss_before) / 1024, sum(len(df) for df in dfs.values())))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare load time and peak RSS of parsed data formats.')
+    arg_parser.add_argument('--cities', type=int, default=5)
+    arg_parser.add_argument('--years', type=int, default=30)
+    args = arg_parser.parse_args()
+
+    dfs = make_parsed_dfs(args.cities, args.years)
+    analyzer_columns = ['min_temp', 'max_temp', 'temp_9', 'temp_3', 'dew_9', 'dew_3', 'sun_perc', 'rain', 'wind']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print('%-8s %-10s %10s %12s %14s %10s' % ('format', 'columns', 'save [s]', 'load [s]', 'peak RSS [MB]',
+                                                 'rows'))
+        for fmt in ['xlsx', 'parquet', 'feather']:
+            path = os.path.join(tmp, 'parsed.xlsx' if fmt == 'xlsx' else fmt)
+
+            start = time.perf_counter()
+            get_storage(fmt, path).save(dfs)
+            save_time = time.perf_counter() - start
+
+            for label, columns in [('all', None), ('analyzer', analyzer_columns)]:
+                queue = multiprocessing.Queue()
+                proc = multiprocessing.Process(target=measure_load, args=(fmt, path, columns, queue))
+                proc.start()
+                load_time, peak_rss, rows = queue.get()
+                proc.join()
+                print('%-8s %-10s %10.3f %12.3f %14.1f %10d' % (fmt, label, save_time, load_time, peak_rss, rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Benchmark of the threshold sweep engine against naive re-scoring of each configuration
+#
+# Usage (from repository root):
+#   python -m benchmarks.bench_sweep [--cities 5] [--days 10000] [--configs 200]
+
+import argparse
+import time
+
+import numpy as np
+
+from src.my_analyzer import Analyzer
+from src.my_sweep import Sweeper
+from benchmarks.bench_scoring import make_scoring_df
+
+
+# Function with the naive loop (mutate limits, re-score every city, count levels)
+def naive_sweep(analyzer, dfs, configs):
+    counts = []
+    for limits in configs:
+        for name in limits:
+            setattr(analyzer, name, limits[name])
+        for city in dfs:
+            y = analyzer.apply_criterion(dfs[city]).value_counts()
+            counts.append([y.get(2, 0), y.get(1, 0), y.get(0, 0)])
+    return np.array(counts)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare threshold sweep engine and naive loop.')
+    arg_parser.add_argument('--cities', type=int, default=5)
+    arg_parser.add_argument('--days', type=int, default=10000)
+    arg_parser.add_argument('--configs', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    dfs = {'City_' + str(k): make_scoring_df(args.days, seed=k) for k in range(args.cities)}
+
+    # Random grid over the most influential limits:
+    rng = np.random.RandomState(0)
+    grid = [{'temp_1.min': float(rng.choice([13, 14, 15, 16])), 'temp_1.max': float(rng.choice([28, 30, 32])),
+             'dew_1.max': float(rng.choice([16, 18, 20])), 'sun_1.min': float(rng.choice([65, 70, 75, 80])),
+             'wind_2.max': float(rng.choice([30, 38, 45]))} for _ in range(args.configs)]
+
+    sweeper = Sweeper(Analyzer())
+    start = time.perf_counter()
+    table = sweeper.sweep(dfs, grid)
+    sweep_time = time.perf_counter() - start
+
+    _, configs = sweeper.make_configs(grid)
+    start = time.perf_counter()
+    naive = naive_sweep(Analyzer(), dfs, configs)
+    naive_time = time.perf_counter() - start
+
+    identical = np.array_equal(table[['Great Day', 'Good Day', 'Bad Day']].values, naive)
+    print('naive loop   %8.3f s' % naive_time)
+    print('sweep engine %8.3f s  speedup %5.1fx  identical: %s' % (sweep_time, naive_time / sweep_time, identical))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Load test of the comfort query service (requests per second and latency percentiles)
+#
+# Usage (from repository root):
+#   python -m benchmarks.load_test [--url http://127.0.0.1:8765] [--connections 32] [--duration 10]
+#
+# Without --url, the service is started in this process on synthetic data.
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from src.my_parser import Parser
+from src.my_service import ComfortService
+from benchmarks.synthetic import make_stations
+
+
+# Function for generating random query targets (mix of count, per-day and override queries)
+def make_targets(cities, years, n_targets, seed=0):
+    rng = random.Random(seed)
+    targets = []
+    for _ in range(n_targets):
+        year = rng.randint(1990, 1990 + years - 1)
+        city = rng.choice(cities)
+        kind = rng.random()
+        if kind < 0.7:
+            targets.append('/counts?cities=%s&start=%d-03-01&end=%d-05-31' % (city, year, year))
+        elif kind < 0.9:
+            targets.append('/days?city=%s&start=%d-01-01&end=%d-01-31' % (city, year, year))
+        else:
+            targets.append('/override?temp_1.min=%d&cities=%s' % (rng.randint(12, 18), city))
+    return targets
+
+
+# Function for running single client connection (keep-alive requests until deadline)
+async def run_client(host, port, targets, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            target = random.choice(targets)
+            start = time.perf_counter()
+            writer.write(('GET %s HTTP/1.1\r\nHost: %s\r\n\r\n' % (target, host)).encode())
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+# Function for running all clients
+async def run_load(host, port, targets, n_connections, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[run_client(host, port, targets, deadline, latencies, errors)
+                           for _ in range(n_connections)])
+    return latencies, errors
+
+
+# Function for starting the service on synthetic data (in background thread)
+def start_service(n_stations, n_years, port):
+    names, latitudes, _, sheets = make_stations(n_stations, n_years)
+    dfs = {name: Parser.derive_df(sheets[name], lat) for name, lat in zip(names, latitudes)}
+    service = ComfortService(dfs=dfs)
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(service.start('127.0.0.1', port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return names
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Load test of the comfort query service.')
+    arg_parser.add_argument('--url', help='service URL (default: start service on synthetic data)')
+    arg_parser.add_argument('--cities', nargs='+', help='queried cities (required with --url)')
+    arg_parser.add_argument('--stations', type=int, default=5)
+    arg_parser.add_argument('--years', type=int, default=30)
+    arg_parser.add_argument('--connections', type=int, default=32)
+    arg_parser.add_argument('--duration', type=float, default=10)
+    arg_parser.add_argument('--targets', type=int, default=500, help='number of distinct queries')
+    args = arg_parser.parse_args()
+
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port, cities = url.hostname, url.port or 80, args.cities
+        if not cities:
+            arg_parser.error('--cities is required with --url')
+    else:
+        host, port = '127.0.0.1', 8766
+        cities = start_service(args.stations, args.years, port)
+
+    targets = make_targets(cities, args.years, args.targets)
+    latencies, errors = asyncio.get_event_loop().run_until_complete(
+        run_load(host, port, targets, args.connections, args.duration))
+
+    latencies = np.array(latencies) * 1000
+    print('requests     %d (%d errors)' % (len(latencies), len(errors)))
+    print('throughput   %.0f requests/s' % (len(latencies) / args.duration))
+    print('latency p50  %.2f ms' % np.percentile(latencies, 50))
+    print('latency p99  %.2f ms' % np.percentile(latencies, 99))
+    print('latency max  %.2f ms' % latencies.max())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# Benchmark suite of the hot paths (time, throughput and peak memory per stage, with regression check)
+#
+# Usage (from repository root):
+#   python -m benchmarks.run_suite [--stations 5] [--years 30] [--missing 0.01] [--stages fill_df calc_dew ...]
+#                                  [--output results.json] [--baseline baseline.json] [--tolerance 0.2]
+#
+# Exits with status 1 when any stage is slower (or needs more memory) than its baseline by more than tolerance.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.my_parser import Parser
+from src.my_analyzer import Analyzer
+from src.my_plotter import Plotter
+from src.my_cache import Cache
+from src.my_archive import HourlyArchive
+from src.my_storage import get_storage
+from benchmarks.synthetic import make_stations, write_source_workbook
+from benchmarks.stub_wwo import StubWWOServer
+
+
+# Benchmark context (synthetic data, temporary directory and stub server shared by all stages)
+class Context:
+
+    def __init__(self, n_stations, n_years, missing_rate, tmp_dir, server):
+        self.names, self.latitudes, self.longitudes, self.sheets = make_stations(n_stations, n_years, missing_rate)
+        self.rows = sum(len(df) for df in self.sheets.values())
+        self.tmp_dir = tmp_dir
+        self.server = server
+        self.workbook = os.path.join(tmp_dir, 'source.xlsx')
+        self.parsed_xlsx = os.path.join(tmp_dir, 'parsed.xlsx')
+        self.parsed_parquet = os.path.join(tmp_dir, 'parsed')
+        self.n_caches = 0
+
+        # Derived DFs (inputs of analysis and plotting stages):
+        self.dfs = {name: Parser.derive_df(self.sheets[name], lat) for name, lat in zip(self.names, self.latitudes)}
+
+    # Method for creating parser of synthetic stations (downloading from the stub server, into an empty cache
+    # and an empty hourly archive)
+    def make_parser(self):
+        self.n_caches += 1
+        cache = Cache(os.path.join(self.tmp_dir, 'cache_%d.sqlite' % self.n_caches))
+        archive = HourlyArchive(os.path.join(self.tmp_dir, 'archive_%d' % self.n_caches))
+        return Parser(cities=self.names, latitudes=self.latitudes, longitudes=self.longitudes,
+                      excel_file=self.workbook, wwo_api_url=self.server.url, cache=cache, archive=archive)
+
+
+# Benchmark stages - each stage prepares its inputs (not timed) and returns the timed function
+def stage_excel_write(ctx):
+    return lambda: write_source_workbook(ctx.sheets, ctx.workbook)
+
+
+def stage_excel_load(ctx):
+    if not os.path.exists(ctx.workbook):
+        write_source_workbook(ctx.sheets, ctx.workbook)
+    return lambda: Parser.load_excel_sheets(list(range(len(ctx.names))), ctx.workbook)
+
+
+def stage_fill_df(ctx):
+    parser = ctx.make_parser()
+    return lambda: {name: parser.fill_df(ctx.sheets[name], name) for name in ctx.names}
+
+
+def stage_parse_data(ctx):
+    if not os.path.exists(ctx.workbook):
+        write_source_workbook(ctx.sheets, ctx.workbook)
+    parser = ctx.make_parser()
+
+    # Whole parsing path (loading, filling and deriving all cities; nothing is saved):
+    def parse():
+        dfs = parser.parse_data(save=False)
+        if sorted(dfs) != sorted(ctx.names) or any('sun_perc' not in df for df in dfs.values()):
+            raise RuntimeError('parse_data returned unexpected DFs')
+        return dfs
+
+    return parse
+
+
+def stage_calc_dew(ctx):
+    return lambda: [Parser.calc_dew(df.hum_9.values, df.temp_9.values) for df in ctx.sheets.values()]
+
+
+def stage_calc_sun_perc(ctx):
+    return lambda: [Parser.calc_sun_perc(ctx.sheets[name].index.dayofyear, ctx.sheets[name].sun, lat)
+                    for name, lat in zip(ctx.names, ctx.latitudes)]
+
+
+def stage_apply_criterion(ctx):
+    analyzer = Analyzer()
+    return lambda: [analyzer.apply_criterion(df) for df in ctx.dfs.values()]
+
+
+def stage_calc_day_counts(ctx):
+    # Fresh analyzer (batch scores are cached between calls):
+    analyzer = Analyzer()
+    return lambda: analyzer.calc_day_counts(ctx.dfs, save=False)
+
+
+def stage_parsed_save_xlsx(ctx):
+    return lambda: get_storage('xlsx', ctx.parsed_xlsx).save(ctx.dfs)
+
+
+def stage_parsed_load_xlsx(ctx):
+    storage = get_storage('xlsx', ctx.parsed_xlsx)
+    if not storage.exists():
+        storage.save(ctx.dfs)
+    return storage.load
+
+
+def stage_parsed_save_parquet(ctx):
+    return lambda: get_storage('parquet', ctx.parsed_parquet).save(ctx.dfs)
+
+
+def stage_parsed_load_parquet(ctx):
+    storage = get_storage('parquet', ctx.parsed_parquet)
+    if not storage.exists():
+        storage.save(ctx.dfs)
+    return storage.load
+
+
+def stage_plotter_reshape(ctx):
+    # Fresh plotter (the long-format DataFrame is cached between calls):
+    plotter = Plotter(headless=True)
+    return lambda: plotter.long_frame(ctx.dfs)
+
+
+STAGES = {'excel_write': stage_excel_write,
+          'excel_load': stage_excel_load,
+          'fill_df': stage_fill_df,
+          'parse_data': stage_parse_data,
+          'calc_dew': stage_calc_dew,
+          'calc_sun_perc': stage_calc_sun_perc,
+          'apply_criterion': stage_apply_criterion,
+          'calc_day_counts': stage_calc_day_counts,
+          'parsed_save_xlsx': stage_parsed_save_xlsx,
+          'parsed_load_xlsx': stage_parsed_load_xlsx,
+          'parsed_save_parquet': stage_parsed_save_parquet,
+          'parsed_load_parquet': stage_parsed_load_parquet,
+          'plotter_reshape': stage_plotter_reshape}
+
+
+# Function for measuring single stage (best time of n_repeat runs, peak memory of a separate traced run)
+def measure_stage(stage, ctx, n_repeat):
+    times = []
+    for _ in range(n_repeat):
+        func = STAGES[stage](ctx)
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Peak of memory allocated during the stage (tracing slows the stage down, so it is not timed):
+    func = STAGES[stage](ctx)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'time': min(times), 'throughput': ctx.rows / min(times), 'peak_memory': peak / 2 ** 20,
+            'rows': ctx.rows}
+
+
+# Function for comparing results with baseline (returns list of regression messages)
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for stage, result in results['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if base is None:
+            continue
+        for metric in ['time', 'peak_memory']:
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append('%s: %s %.3f -> %.3f (+%.0f%%)' % (stage, metric, base[metric], result[metric],
+                                                                     100 * (result[metric] / base[metric] - 1)))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark hot paths on synthetic multi-station data.')
+    arg_parser.add_argument('--stations', type=int, default=5)
+    arg_parser.add_argument('--years', type=float, default=30)
+    arg_parser.add_argument('--missing', type=float, default=0.01, help='missing value rate')
+    arg_parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--latency', type=float, default=0, help='stub WWO server response delay [s]')
+    arg_parser.add_argument('--output', help='save results to JSON file')
+    arg_parser.add_argument('--baseline', help='compare results with saved JSON file')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    args = arg_parser.parse_args()
+
+    results = {'config': {'stations': args.stations, 'years': args.years, 'missing': args.missing,
+                          'repeat': args.repeat, 'latency': args.latency},
+               'platform': {'python': platform.python_version(), 'machine': platform.machine(),
+                            'cpus': os.cpu_count()},
+               'stages': {}}
+
+    with tempfile.TemporaryDirectory() as tmp, StubWWOServer(latency=args.latency) as server:
+        ctx = Context(args.stations, args.years, args.missing, tmp, server)
+        print('%d stations, %d rows' % (args.stations, ctx.rows))
+        print('%-20s %10s %14s %12s' % ('stage', 'time [s]', 'rows/s', 'peak [MB]'))
+
+        for stage in args.stages:
+            result = measure_stage(stage, ctx, args.repeat)
+            results['stages'][stage] = result
+            print('%-20s %10.4f %14.0f %12.1f' % (stage, result['time'], result['throughput'],
+                                                  result['peak_memory']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print('REGRESSION', message)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# Stub WWO past weather server (serves deterministic synthetic responses, for benchmarks and offline runs)
+#
+# Usage (from repository root):
+#   python -m benchmarks.stub_wwo [--port 8080] [--latency 0.05] [--error-rate 0.01]
+#
+# then point the downloader to it, e.g. Parser(wwo_api_url='http://127.0.0.1:8080/past-weather.ashx')
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+
+
+# Function for generating synthetic WWO day data (deterministic for given city and date)
+def make_wwo_day(city, dt):
+    rng = random.Random(zlib.crc32((city + dt.strftime('%Y-%m-%d')).encode()))
+    min_temp = rng.randint(5, 20)
+    max_temp = min_temp + rng.randint(3, 15)
+    hourly = [{'time': str(hour * 100),
+               'tempC': str(rng.randint(min_temp, max_temp)),
+               'humidity': str(rng.randint(20, 95)),
+               'precipMM': '%.1f' % (rng.expovariate(2) if rng.random() < 0.2 else 0),
+               'windspeedKmph': str(rng.randint(0, 40)),
+               'cloudcover': str(rng.randint(0, 100))} for hour in range(0, 24, 3)]
+    return {'date': dt.strftime('%Y-%m-%d'), 'mintempC': str(min_temp), 'maxtempC': str(max_temp),
+            'sunHour': '%.1f' % rng.uniform(0, 13), 'hourly': hourly}
+
+
+class StubWWOHandler(BaseHTTPRequestHandler):
+    # Request handler (answers 'date' / 'enddate' range requests, like the WWO past weather endpoint)
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        server = self.server
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        with server.lock:
+            server.n_requests += 1
+            failed = server.rng.random() < server.error_rate
+
+        # Simulated transient server error:
+        if failed:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+
+        try:
+            city = query['q'][0]
+            start = datetime.datetime.strptime(query['date'][0], '%Y-%m-%d')
+            end = datetime.datetime.strptime(query.get('enddate', query['date'])[0], '%Y-%m-%d')
+            days = [make_wwo_day(city, start + datetime.timedelta(days=k)) for k in range((end - start).days + 1)]
+            data = {'data': {'weather': days}}
+        except (KeyError, ValueError):
+            data = {'data': {'error': [{'msg': 'Invalid request'}]}}
+
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubWWOServer:
+    # Stub server running in a background thread (usable as a context manager)
+
+    # Method for class initialization:
+    def __init__(self, host='127.0.0.1', port=0, latency=0, error_rate=0, seed=0):
+        # host, port - listening address (port 0 - any free port)
+        # latency    - delay of each response [s]
+        # error_rate - probability of responding with HTTP 503
+
+        self.server = ThreadingHTTPServer((host, port), StubWWOHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.error_rate = error_rate
+        self.server.rng = random.Random(seed)
+        self.server.lock = threading.Lock()
+        self.server.n_requests = 0
+        self.thread = None
+
+    # Past weather endpoint URL of the server
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d/past-weather.ashx' % (host, port)
+
+    # Number of served requests
+    @property
+    def n_requests(self):
+        return self.server.n_requests
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Run stub WWO past weather server.')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--latency', type=float, default=0, help='response delay [s]')
+    arg_parser.add_argument('--error-rate', type=float, default=0, help='probability of HTTP 503 responses')
+    args = arg_parser.parse_args()
+
+    server = StubWWOServer(args.host, args.port, args.latency, args.error_rate)
+    print('Serving', server.url)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Synthetic multi-station meteorological data (same shape as Parser.load_excel_sheet output)
+#
+# Usage (from repository root, writes a source-format workbook):
+#   python -m benchmarks.synthetic --stations 5 --years 30 --missing 0.01 --output "data/Synthetic Data.xlsx"
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.my_parser import Parser
+
+
+# Function for generating single station sheet (seasonal weather at given latitude, with missing values)
+def make_station_sheet(n_years, missing_rate=0.01, latitude=-33.9, start='1990-01-01', seed=0):
+    # n_years      - number of years of daily data
+    # missing_rate - probability of each value being missing
+    # latitude     - geographical latitude of the station [deg] (sets seasonal amplitude and phase)
+    # start        - first date
+    # seed         - random seed
+    #
+    # Returns DataFrame with Date index and Parser.columns (as returned by Parser.load_excel_sheet)
+
+    rng = np.random.RandomState(seed)
+    index = pd.date_range(start, periods=int(round(n_years * 365.25)), name='Date')
+    n = len(index)
+
+    # Seasonal cycle (summer peak in January on the southern hemisphere, in July on the northern one):
+    phase = 2 * np.pi * (index.dayofyear.values - (15 if latitude < 0 else 196)) / 365.25
+    season = np.cos(phase)
+    amplitude = 4 + abs(latitude) / 6
+
+    min_temp = 12 + amplitude * season + rng.normal(0, 3, n)
+    max_temp = min_temp + rng.gamma(4, 2.5, n)
+    hum_9 = np.clip(rng.normal(70, 12, n), 5, 100)
+    hum_3 = np.clip(hum_9 - rng.gamma(4, 5, n), 5, 100)
+    rain = rng.exponential(4, n) * (rng.uniform(size=n) < 0.3)
+
+    df = pd.DataFrame({'min_temp': min_temp.round(1),
+                       'max_temp': max_temp.round(1),
+                       'rain': rain.round(1),
+                       'sun': np.clip(rng.normal(7.5 + 2 * season, 3, n), 0, 14).round(1),
+                       'wind': rng.gamma(6, 6, n).round(0),
+                       'temp_9': (min_temp + rng.uniform(1, 6, n)).round(1),
+                       'hum_9': hum_9.round(0),
+                       'temp_3': (max_temp - rng.uniform(0, 3, n)).round(1),
+                       'hum_3': hum_3.round(0)},
+                      index=index, columns=Parser.columns)
+
+    # Missing values (independently in each cell):
+    return df.mask(rng.uniform(size=df.shape) < missing_rate)
+
+
+# Function for generating multiple stations
+def make_stations(n_stations, n_years, missing_rate=0.01, seed=0):
+    # n_stations   - number of stations
+    # n_years      - number of years of daily data
+    # missing_rate - probability of each value being missing
+    #
+    # Returns station names, latitudes, longitudes and dictionary mapping names to sheets
+
+    rng = np.random.RandomState(seed)
+    names = ['Station_' + str(k) for k in range(n_stations)]
+    latitudes = list(rng.uniform(-43, -12, n_stations).round(4))
+    longitudes = list(rng.uniform(114, 153, n_stations).round(4))
+    sheets = {name: make_station_sheet(n_years, missing_rate, lat, seed=seed + k)
+              for k, (name, lat) in enumerate(zip(names, latitudes))}
+    return names, latitudes, longitudes, sheets
+
+
+# Function for writing sheets to a workbook in the source format (readable by Parser.load_excel_sheets)
+def write_source_workbook(sheets, file_path):
+    # sheets    - dictionary mapping station names to sheets (see make_station_sheet)
+    # file_path - output Excel file
+
+    writer = pd.ExcelWriter(file_path)
+    for name, df in sheets.items():
+        source = df.copy()
+        source.columns = Parser.source_columns
+        source.reset_index().to_excel(writer, sheet_name=name, index=False)
+    writer.save()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Write synthetic source workbook.')
+    arg_parser.add_argument('--stations', type=int, default=5)
+    arg_parser.add_argument('--years', type=float, default=30)
+    arg_parser.add_argument('--missing', type=float, default=0.01, help='missing value rate')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', default='data/Synthetic Data.xlsx')
+    args = arg_parser.parse_args()
+
+    names, latitudes, _, sheets = make_stations(args.stations, args.years, args.missing, args.seed)
+    write_source_workbook(sheets, args.output)
+    for name, lat in zip(names, latitudes):
+        print('%-12s %9.4f %8d rows' % (name, lat, len(sheets[name])))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,38 +2,70 @@
 from src.my_parser import Parser
 from src.my_analyzer import Analyzer
 from src.my_plotter import Plotter
-import os.path
+from src.my_pipeline import Pipeline
+from src.my_metrics import metrics, JsonLogExporter, PrometheusExporter
+import argparse
+import logging
+
+# Parse command line arguments:
+arg_parser = argparse.ArgumentParser(description='Meteorological comfort analysis pipeline '
+                                                 '(ingest -> backfill -> derive -> score -> aggregate -> render). '
+                                                 'Stages with unchanged inputs are skipped.')
+arg_parser.add_argument('--cities', nargs='+', help='selected cities (default: all cities)')
+arg_parser.add_argument('--start', help='first selected date, YYYY-MM-DD (default: beginning of the data)')
+arg_parser.add_argument('--end', help='last selected date, YYYY-MM-DD (default: end of the data)')
+arg_parser.add_argument('--stages', nargs='+', choices=list(Pipeline.stages),
+                        help='requested stages, stale upstream stages are run as well (default: all stages)')
+arg_parser.add_argument('--force', action='store_true', help='rerun requested stages even if inputs are unchanged')
+arg_parser.add_argument('--freq', default='M', help='calendar period of aggregated counts (default: M)')
+arg_parser.add_argument('--out-dir', default='output', help='output directory of graphs and day counts')
+arg_parser.add_argument('--formats', nargs='+', default=['png'], help='exported graph formats (default: png)')
+arg_parser.add_argument('--show', action='store_true', help='also show graphs interactively')
+arg_parser.add_argument('--verbose', action='store_true', help='log pipeline progress')
+arg_parser.add_argument('--metrics-log', nargs='?', const='-', metavar='FILE',
+                        help='write timing spans and metrics as JSON lines (to FILE, default: standard error)')
+arg_parser.add_argument('--metrics-file', metavar='FILE', help='write metrics in Prometheus text format to FILE')
+args = arg_parser.parse_args()
+
+if args.verbose:
+    logging.getLogger().setLevel(logging.INFO)
+
+# Enable instrumentation (optionally):
+exporters = []
+if args.metrics_log:
+    exporters.append(JsonLogExporter(None if args.metrics_log == '-' else args.metrics_log))
+if args.metrics_file:
+    exporters.append(PrometheusExporter(args.metrics_file))
+if exporters:
+    metrics.enable(exporters)
 
 # Initialize class instances:
 parser = Parser()
 analyzer = Analyzer()
-plotter = Plotter(fig_size=(10, 5))
-
-# Parse the data:
-
-# If already parsed - just load the saved data:
-if os.path.exists('data/updated_meteo_data.xlsx'):
-    # This method loads previously parsed data
-    dfs = parser.load_parsed_dfs()
-# If not - parse the data and save to file:
-else:
-    # This method reads original data, fills missing values,
-    # performs required processing and saves obtained data
-    dfs = parser.parse_data(save=True)
-
-# Perform comfort level analysis and save counts to file:
-
-# This method computes parameter-specific comfort indicators,
-# then uses them to calculate daily comfort levels,
-# and performs a daily comfort count over all cities
-count = analyzer.calc_day_counts(dfs)
-print(count.head())
-
-# Plot required graphs:
-
-# These methods output required violin graphs
-plotter.plot_temp_graph(dfs)
-plotter.plot_humidity_graph(dfs)
-plotter.plot_sunlight_graph(dfs)
-plotter.plot_wind_graph(dfs)
-plotter.plot_rain_graph(dfs)
+plotter = Plotter(fig_size=(10, 5), headless=True, out_dir=args.out_dir, formats=args.formats)
+pipeline = Pipeline(parser, analyzer, plotter, cities=args.cities, start=args.start, end=args.end, freq=args.freq)
+
+# Run the pipeline:
+
+# This method runs requested stages (and their stale upstream stages),
+# while stages with unchanged inputs and configuration are skipped
+status = pipeline.run(args.stages, force=args.force)
+metrics.export()
+for stage in status:
+    print('%-10s %s' % (stage, status[stage]))
+
+# Print daily comfort counts over all cities:
+if 'score' in status:
+    print(pipeline.output('score')['counts'].head())
+
+# Show required graphs (optionally):
+if args.show and 'derive' in status:
+    dfs = pipeline.output('derive')
+    plotter = Plotter(fig_size=(10, 5))
+
+    # These methods output required violin graphs
+    plotter.plot_temp_graph(dfs)
+    plotter.plot_humidity_graph(dfs)
+    plotter.plot_sunlight_graph(dfs)
+    plotter.plot_wind_graph(dfs)
+    plotter.plot_rain_graph(dfs)
@@ -0,0 +1,23 @@
+# Import required libraries:
+from src.my_service import ComfortService
+import argparse
+import logging
+
+# Parse command line arguments:
+arg_parser = argparse.ArgumentParser(description='Local HTTP/JSON service answering comfort queries from memory '
+                                                 '(parsed data is reloaded when it changes).')
+arg_parser.add_argument('--host', default='127.0.0.1')
+arg_parser.add_argument('--port', type=int, default=8765)
+arg_parser.add_argument('--fmt', default='parquet', help='parsed data storage format (default: parquet)')
+arg_parser.add_argument('--path', help='parsed data storage path (default: path of the storage format)')
+arg_parser.add_argument('--cache-size', type=int, default=1024, help='maximum number of cached responses')
+arg_parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help='interval of checking parsed data for changes [s] (0 - never reload)')
+args = arg_parser.parse_args()
+
+logging.getLogger().setLevel(logging.INFO)
+
+# Load parsed data, score it and serve queries:
+service = ComfortService(fmt=args.fmt, path=args.path, cache_size=args.cache_size,
+                         reload_interval=args.reload_interval or None)
+service.serve_forever(args.host, args.port)
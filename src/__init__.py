@@ -0,0 +1,38 @@
+# Package exports are imported lazily (on first attribute access), so that e.g. 'from src import Analyzer'
+# does not import the downloader or the plotting stack
+
+# Exported names and their modules:
+_exports = {'Parser': 'src.my_parser',
+            'Analyzer': 'src.my_analyzer',
+            'Plotter': 'src.my_plotter',
+            'Pipeline': 'src.my_pipeline',
+            'Downloader': 'src.my_downloader',
+            'Cache': 'src.my_cache',
+            'HourlyArchive': 'src.my_archive',
+            'Aggregator': 'src.my_aggregator',
+            'Sweeper': 'src.my_sweep',
+            'StationRegistry': 'src.my_stations',
+            'Summarizer': 'src.my_summary',
+            'DerivedFeatures': 'src.my_features',
+            'get_storage': 'src.my_storage',
+            'metrics': 'src.my_metrics',
+            'CompactSchema': 'src.my_schema',
+            'QueryIndex': 'src.my_query',
+            'ComfortService': 'src.my_service'}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError("module 'src' has no attribute " + repr(name))
+
+    import importlib
+    value = getattr(importlib.import_module(_exports[name]), name)
+    # Cache the value (later accesses do not go through __getattr__):
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,107 @@
+import pandas as pd
+import numpy as np
+
+from src.my_analyzer import Analyzer
+
+
+class Aggregator:
+
+    # Comfort level columns (in order of comfort level values: 0 - bad, 1 - good, 2 - great day):
+    levels = ['Bad Day', 'Good Day', 'Great Day']
+
+    # Season names (by month ending the season, for resampling quarters ending in Feb, May, Aug and Nov):
+    seasons = {'south': {2: 'Summer', 5: 'Autumn', 8: 'Winter', 11: 'Spring'},
+               'north': {2: 'Winter', 5: 'Spring', 8: 'Summer', 11: 'Autumn'}}
+
+    # Method for class initialization:
+    def __init__(self, analyzer=None):
+        # analyzer - Analyzer instance (its cached batch scores are reused by all aggregations)
+        self.analyzer = analyzer or Analyzer()
+
+    # # # Method for computing daily comfort level indicators (one column per level) of all cities
+    def daily_counts(self, dfs):
+        # dfs - dictionary mapping cities to corresponding DataFrames
+        #
+        # Returns dictionary mapping cities to DataFrames (indexed by date, 0/1 per level)
+
+        scored = self.analyzer.score_batch(dfs)
+        onehot = np.eye(3, dtype=np.int32)[scored.score.values][:, ::-1]
+
+        # Split stacked rows back into cities (rows of each city are contiguous):
+        bounds = np.cumsum([0] + [len(dfs[city]) for city in dfs])
+        return {city: pd.DataFrame(onehot[bounds[k]:bounds[k + 1]], index=scored.index[bounds[k]:bounds[k + 1]],
+                                   columns=self.levels[::-1])
+                for k, city in enumerate(dfs)}
+
+    # # # Method for computing rolling comfort counts (over trailing window of days)
+    def rolling_counts(self, dfs, window=7):
+        # dfs    - dictionary mapping cities to corresponding DataFrames
+        # window - window length [days]
+        #
+        # Returns dictionary mapping cities to DataFrames with level counts over the window ending on each day
+
+        results = {}
+        for city, daily in self.daily_counts(dfs).items():
+            daily = daily.sort_index()
+
+            # Cumulative counts (with leading zero row):
+            cum = np.vstack([np.zeros((1, 3), dtype=np.int64), np.cumsum(daily.values, axis=0)])
+
+            # Position of the first day inside each window (handles missing days in the index):
+            dates = daily.index.values
+            start = np.searchsorted(dates, dates - np.timedelta64(window, 'D'), side='right')
+
+            counts = cum[1:] - cum[start]
+            results[city] = pd.DataFrame(counts, index=daily.index, columns=daily.columns)
+
+        return results
+
+    # # # Method for computing calendar comfort counts (month by month, year by year, ...)
+    def calendar_counts(self, dfs, freq='M'):
+        # dfs  - dictionary mapping cities to corresponding DataFrames
+        # freq - calendar period ('M' - months, 'A' - years, 'W' - weeks, ...)
+        #
+        # Returns dictionary mapping cities to DataFrames with level counts per period
+
+        return {city: daily.resample(freq).sum().to_period(freq)
+                for city, daily in self.daily_counts(dfs).items()}
+
+    # # # Method for computing seasonal comfort counts
+    def seasonal_counts(self, dfs, hemisphere='south'):
+        # dfs        - dictionary mapping cities to corresponding DataFrames
+        # hemisphere - 'south' or 'north' (for naming the seasons)
+        #
+        # Returns dictionary mapping cities to DataFrames with level counts per season (December belongs
+        # to the season of the following year)
+
+        results = {}
+        for city, daily in self.daily_counts(dfs).items():
+            df = daily.resample('Q-NOV').sum()
+            df.index = pd.MultiIndex.from_arrays([df.index.year, [self.seasons[hemisphere][m] for m in df.index.month]],
+                                                 names=['Year', 'Season'])
+            results[city] = df
+        return results
+
+    # # # Method for comparing comfort counts of the same periods in different years
+    def year_over_year(self, dfs, level='Great Day', by='month', hemisphere='south'):
+        # dfs        - dictionary mapping cities to corresponding DataFrames
+        # level      - comfort level to compare ('Great Day', 'Good Day' or 'Bad Day')
+        # by         - period of the year ('month' or 'season')
+        # hemisphere - 'south' or 'north' (for naming the seasons, with by='season')
+        #
+        # Returns dictionary mapping cities to DataFrames (periods of the year in rows, years in columns)
+
+        if by not in ('month', 'season'):
+            raise ValueError('Unknown period of the year: ' + str(by) + ' (expected month or season)')
+        if hemisphere not in self.seasons:
+            raise ValueError('Unknown hemisphere: ' + str(hemisphere) + ' (expected south or north)')
+
+        if by == 'season':
+            return {city: df[level].unstack('Year') for city, df in self.seasonal_counts(dfs, hemisphere).items()}
+
+        results = {}
+        for city, df in self.calendar_counts(dfs, 'M').items():
+            df = df[level]
+            df.index = pd.MultiIndex.from_arrays([df.index.year, df.index.month], names=['Year', 'Month'])
+            results[city] = df.unstack('Year')
+        return results
@@ -1,9 +1,27 @@
 import pandas as pd
+import numpy as np
+
+from src.my_metrics import metrics
+from src.my_schema import decode_column
+
+# Optional accelerated expression evaluation:
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
 
 
 class Analyzer:
+
+    # Names of all comfort limits (great and good day limits of each parameter):
+    limit_names = ['temp_1', 'temp_2', 'dew_1', 'dew_2', 'sun_1', 'sun_2', 'rain_1', 'rain_2', 'wind_1', 'wind_2']
+    # Names of comfort parameters (in order of parameter-specific indicators):
+    criteria = ['temp', 'dew', 'sun', 'rain', 'wind']
+
     # Method for initializing decision tree rules:
-    def __init__(self):
+    def __init__(self, compact=False):
+        # compact - return daily comfort levels as uint8 (instead of int64)
+
         # Temperature limits (minimum, maximum, swing and mean temperatures):
         self.temp_1 = {'min': 15, 'max': 30, 'delta': 12.5, 'mean': [20, 25]}
         self.temp_2 = {'min': 10, 'max': 32.5, 'delta': 17.5, 'mean': [17.5, 27.5]}
@@ -19,13 +37,17 @@ class Analyzer:
         # Maximum wind speed limits (from Beaufort scale):
         self.wind_1 = {'max': 28}  # Moderate breeze
         self.wind_2 = {'max': 38}  # Fresh breeze
+        # Columns required by the criteria (for loading only needed data):
+        self.columns = ['min_temp', 'max_temp', 'temp_9', 'temp_3', 'dew_9', 'dew_3', 'sun_perc', 'rain', 'wind']
+        # Cached batch scores (key, scored DFs, scores):
+        self.scored = None
+        # Data type of daily comfort levels (0, 1 or 2):
+        self.score_dtype = np.uint8 if compact else np.int64
 
     # # # Method for saving daily weather indicators
     def calc_day_counts(self, dfs, save=True):
-        d = {}
-        for city in dfs:
-            y = self.apply_criterion(dfs[city]).value_counts()
-            d[city] = [y[2] if 2 in y.index else 0, y[1] if 1 in y.index else 0, y[0] if 0 in y.index else 0]
+        counts = self.count_batch(dfs)
+        d = {city: [counts[k, 2], counts[k, 1], counts[k, 0]] for k, city in enumerate(dfs)}
         df = pd.DataFrame(data=d).rename(index={0: 'Great Day', 1: 'Good Day', 2: 'Bad Day'})
         if save:
             df.to_excel('data/day_counts.xlsx')
@@ -33,31 +55,202 @@ class Analyzer:
 
     # # # Method for counting daily weather indicators
     def print_day_counts(self, dfs):
-        for city in dfs:
+        counts = self.count_batch(dfs)
+        for k, city in enumerate(dfs):
             print('#', city + ':')
-            y = self.apply_criterion(dfs[city]).value_counts()
-            print('Great:', y[2] if 2 in y.index else '/')
-            print('Good :', y[1] if 1 in y.index else '/')
-            print('Bad  :', y[0] if 0 in y.index else '/', '\n')
+            print('Great:', counts[k, 2] or '/')
+            print('Good :', counts[k, 1] or '/')
+            print('Bad  :', counts[k, 0] or '/', '\n')
+
+    # # # Method for stacking all cities into single long DataFrame (with categorical city key)
+    def stack_dfs(self, dfs):
+        # dfs - dictionary mapping cities to corresponding DataFrames
+
+        cities = list(dfs)
+        lengths = [len(dfs[city]) for city in cities]
+
+        # Concatenate raw column arrays of all cities (compact columns are decoded):
+        data = {col: np.concatenate([decode_column(dfs[city][col].values, col) for city in cities])
+                if cities else np.empty(0) for col in self.columns}
+        data['city'] = pd.Categorical.from_codes(np.repeat(np.arange(len(cities)), lengths), categories=cities)
+
+        index = dfs[cities[0]].index.append([dfs[city].index for city in cities[1:]]) if cities else None
+        return pd.DataFrame(data, index=index)
+
+    # # # Method for scoring all cities at once (result is cached, until data or limits change)
+    def score_batch(self, dfs):
+        # dfs - dictionary mapping cities to corresponding DataFrames
+        #
+        # Returns long DataFrame with city key and daily comfort level (0 - bad, 1 - good, 2 - great day)
+
+        key = (tuple((city, id(dfs[city])) for city in dfs), self.limits_key())
+        if self.scored is not None and self.scored[0] == key:
+            metrics.incr('score_cache_hits')
+            return self.scored[2]
+
+        df = self.stack_dfs(dfs)
+        scored = pd.DataFrame({'city': df.city, 'score': self.score_arrays({col: df[col].values
+                                                                            for col in self.columns})},
+                              index=df.index)
+
+        # Keep references to the scored DFs (so their ids stay valid while cached):
+        self.scored = (key, dfs.copy(), scored)
+        return scored
+
+    # # # Method for counting comfort levels per city (array of shape [cities, levels])
+    def count_batch(self, dfs):
+        scored = self.score_batch(dfs)
+        counts = np.bincount(scored.city.cat.codes.values.astype(np.int64) * 3 + scored.score.values,
+                             minlength=3 * len(dfs))
+        return counts.reshape(len(dfs), 3)
+
+    # # # Method for creating hashable key of all comfort limits
+    def limits_key(self):
+        return repr([getattr(self, name) for name in self.limit_names])
+
+    # # # Method for dropping cached scores (e.g. after modifying DFs in place)
+    def clear_cache(self):
+        self.scored = None
 
     # # # Method for computing all daily weather indicators
     def apply_criterion(self, df):
-        data = {}
+        # Extract raw column arrays:
+        arrays = {col: decode_column(df[col].values, col) for col in self.columns}
+
+        return pd.Series(self.score_arrays(arrays).astype(self.score_dtype, copy=False), index=df.index)
 
-        # Computing day type indicators
-        data['temp'] = self.temp_criterion(df)
-        data['dew'] = self.dew_criterion(df)
-        data['sun'] = self.sun_criterion(df)
-        data['rain'] = self.rain_criterion(df)
-        data['wind'] = self.wind_criterion(df)
+    # # # Method for computing daily comfort levels from raw column arrays (fused kernel)
+    def score_arrays(self, arrays, block_size=65536):
+        # arrays     - dictionary mapping column names to NumPy float arrays
+        # block_size - number of rows processed at once (keeps temporaries in CPU cache)
+        #
+        # Returns uint8 array of comfort levels (0 - bad, 1 - good, 2 - great day)
 
-        crit = pd.DataFrame(data=data)
+        n = len(arrays['min_temp'])
+        x = np.empty(n, dtype=np.uint8)
 
-        x = ((crit.sum(axis=1) > (3 * 2 + 2 * 1)) & ((crit == 0).sum(axis=1) == 0)) * 1
-        x += ((crit.sum(axis=1) > (4 * 1)) & ((crit == 0).sum(axis=1) <= 1)) * 1
+        with metrics.span('score'):
+            for start in range(0, n, block_size):
+                block = {col: arrays[col][start:start + block_size] for col in self.columns}
+                x[start:start + block_size] = self.score_block(block)
+        metrics.incr('rows_scored', n)
 
         return x
 
+    # # # Method for computing daily comfort levels of single block of rows
+    def score_block(self, a):
+        # a - dictionary mapping column names to NumPy float arrays
+
+        t_mean, dew_min, dew_max = self.calc_features(a)
+
+        if numexpr is not None:
+            with np.errstate(invalid='ignore'):
+                return numexpr.evaluate(self.score_expr, local_dict=dict(a, t_mean=t_mean, dew_min=dew_min,
+                                                                         dew_max=dew_max)).astype(np.uint8)
+
+        # Parameter-specific indicators (0, 1 or 2):
+        crit = self.criterion_levels(a, t_mean, dew_min, dew_max)
+
+        # Sum of indicators and number of bad indicators:
+        total = crit[0] + crit[1] + crit[2] + crit[3] + crit[4]
+        zeros = ((crit[0] == 0).view(np.uint8) + (crit[1] == 0).view(np.uint8) + (crit[2] == 0).view(np.uint8) +
+                 (crit[3] == 0).view(np.uint8) + (crit[4] == 0).view(np.uint8))
+
+        x = ((total > (3 * 2 + 2 * 1)) & (zeros == 0)).view(np.uint8)
+        x += ((total > (4 * 1)) & (zeros <= 1)).view(np.uint8)
+
+        return x
+
+    # # # Method for computing parameter-specific indicators (0, 1 or 2) of single block of rows
+    def criterion_levels(self, a, t_mean, dew_min, dew_max):
+        # a                        - dictionary mapping column names to NumPy float arrays
+        # t_mean, dew_min, dew_max - derived daily features (see calc_features)
+        #
+        # Returns list of uint8 arrays (in order of Analyzer.criteria)
+
+        with np.errstate(invalid='ignore'):
+            return [
+                self.levels((a['min_temp'] >= self.temp_1['min']) & (a['max_temp'] <= self.temp_1['max']) &
+                            (a['max_temp'] - a['min_temp'] <= self.temp_1['delta']) &
+                            (t_mean >= self.temp_1['mean'][0]) & (t_mean <= self.temp_1['mean'][1]),
+                            (a['min_temp'] >= self.temp_2['min']) & (a['max_temp'] <= self.temp_2['max']) &
+                            (a['max_temp'] - a['min_temp'] <= self.temp_2['delta']) &
+                            (t_mean >= self.temp_2['mean'][0]) & (t_mean <= self.temp_2['mean'][1])),
+                self.levels((dew_min >= self.dew_1['min']) & (dew_max <= self.dew_1['max']),
+                            (dew_min >= self.dew_2['min']) & (dew_max <= self.dew_2['max'])),
+                self.levels(a['sun_perc'] >= self.sun_1['min'], a['sun_perc'] >= self.sun_2['min']),
+                self.levels(a['rain'] <= self.rain_1['max'], a['rain'] <= self.rain_2['max']),
+                self.levels(a['wind'] <= self.wind_1['max'], a['wind'] <= self.wind_2['max']),
+            ]
+
+    # # # Method for computing parameter-specific indicators from raw column arrays
+    def criteria_arrays(self, arrays, block_size=65536):
+        # arrays     - dictionary mapping column names to NumPy float arrays
+        # block_size - number of rows processed at once
+        #
+        # Returns uint8 array of shape [rows, criteria] (levels 0, 1 or 2 of each parameter)
+
+        n = len(arrays['min_temp'])
+        x = np.empty((n, len(self.criteria)), dtype=np.uint8)
+
+        for start in range(0, n, block_size):
+            block = {col: arrays[col][start:start + block_size] for col in self.columns}
+            x[start:start + block_size] = np.column_stack(self.criterion_levels(block, *self.calc_features(block)))
+
+        return x
+
+    # # # Method for computing derived daily features (mean temperature, min and max dew point)
+    @staticmethod
+    def calc_features(a):
+        # a - dictionary mapping column names to NumPy float arrays
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Mean temperature (ignoring missing values, summed in the same order as DataFrame.mean):
+            t_sum = np.zeros(len(a['min_temp']))
+            t_cnt = np.zeros(len(a['min_temp']))
+            for col in ['min_temp', 'max_temp', 'temp_3', 'temp_9']:
+                valid = a[col] == a[col]
+                t_sum += np.where(valid, a[col], 0)
+                t_cnt += valid
+            t_mean = t_sum / t_cnt
+
+        # Min and max dew points (ignoring missing values):
+        dew_min = np.fmin(a['dew_3'], a['dew_9'])
+        dew_max = np.fmax(a['dew_3'], a['dew_9'])
+
+        return t_mean, dew_min, dew_max
+
+    # # # Method for combining great and good day conditions into indicator levels (0, 1 or 2)
+    @staticmethod
+    def levels(great, good):
+        return great.view(np.uint8) + good.view(np.uint8)
+
+    # # # Property with the whole scoring rule as single numexpr expression (evaluated in one pass)
+    @property
+    def score_expr(self):
+        def level(great, good):
+            return '(where(' + great + ', 1, 0) + where(' + good + ', 1, 0))'
+
+        def temp(lim):
+            return ('(min_temp >= %r) & (max_temp <= %r) & (max_temp - min_temp <= %r) & '
+                    '(t_mean >= %r) & (t_mean <= %r)' % (lim['min'], lim['max'], lim['delta'],
+                                                         lim['mean'][0], lim['mean'][1]))
+
+        def dew(lim):
+            return '(dew_min >= %r) & (dew_max <= %r)' % (lim['min'], lim['max'])
+
+        crit = [level(temp(self.temp_1), temp(self.temp_2)),
+                level(dew(self.dew_1), dew(self.dew_2)),
+                level('sun_perc >= %r' % self.sun_1['min'], 'sun_perc >= %r' % self.sun_2['min']),
+                level('rain <= %r' % self.rain_1['max'], 'rain <= %r' % self.rain_2['max']),
+                level('wind <= %r' % self.wind_1['max'], 'wind <= %r' % self.wind_2['max'])]
+
+        total = '(' + ' + '.join(crit) + ')'
+        zeros = '(' + ' + '.join('where(' + c + ' == 0, 1, 0)' for c in crit) + ')'
+
+        return ('where((' + total + ' > 8) & (' + zeros + ' == 0), 1, 0) + '
+                'where((' + total + ' > 4) & (' + zeros + ' <= 1), 1, 0)')
+
     # # # Method for computing daily temperature indicators
     def temp_criterion(self, df):
         # Great day limits:
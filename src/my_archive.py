@@ -0,0 +1,260 @@
+import threading
+import logging
+import os
+
+import pandas as pd
+import numpy as np
+
+# Record of each downloaded day (row of daily WWO values):
+DAILY_DTYPE = np.dtype([('day', '<i4'), ('min_temp', '<f4'), ('max_temp', '<f4'), ('sun', '<f4')])
+
+# Record of each hourly WWO entry (linked to its daily record by row number):
+HOURLY_DTYPE = np.dtype([('row', '<i4'), ('hour', 'u1'), ('temp', '<f4'), ('hum', '<f4'), ('precip', '<f4'),
+                         ('wind', '<f4'), ('cloud', '<f4')])
+
+# WWO fields of daily and hourly records (in order of record fields):
+DAILY_FIELDS = {'min_temp': 'mintempC', 'max_temp': 'maxtempC', 'sun': 'sunHour'}
+HOURLY_FIELDS = {'temp': 'tempC', 'hum': 'humidity', 'precip': 'precipMM', 'wind': 'windspeedKmph',
+                 'cloud': 'cloudcover'}
+
+# Decimal places of stored values (float32 values are rounded back to their exact decimal values):
+DECIMALS = {'min_temp': 0, 'max_temp': 0, 'sun': 1, 'temp': 0, 'hum': 0, 'precip': 2, 'wind': 0, 'cloud': 0}
+
+
+class Records:
+    # Append-only array of records (capacity is doubled when exhausted)
+
+    def __init__(self, dtype, records=None):
+        self.data = np.zeros(16, dtype=dtype)
+        self.n = 0
+        if records is not None:
+            self.extend(records)
+
+    # Method for appending records
+    def extend(self, records):
+        if self.n + len(records) > len(self.data):
+            data = np.zeros(max(2 * len(self.data), self.n + len(records)), dtype=self.data.dtype)
+            data[:self.n] = self.data[:self.n]
+            self.data = data
+        self.data[self.n:self.n + len(records)] = records
+        self.n += len(records)
+
+    # Stored records (view, without copying)
+    @property
+    def values(self):
+        return self.data[:self.n]
+
+
+class HourlyArchive:
+    # Compact columnar archive of downloaded WWO data (per city, append-only)
+    #
+    # Each WWO day payload is decoded once into one daily record and its hourly records. Daily results of
+    # the downloader and any other daily features are derived from the archive (without network calls).
+    # Re-downloaded days are appended as well, and the latest payload of each day is used.
+
+    # Method for class initialization:
+    def __init__(self, path=None):
+        # path - archive directory (two binary files per city, appended on each download; None - memory only)
+
+        self.path = path
+        self.daily = {}
+        self.hourly = {}
+        self.lock = threading.Lock()
+
+    # Method for creating file path of city records
+    def city_path(self, city, kind):
+        return os.path.join(self.path, city + '.' + kind)
+
+    # Method for reading stored records of single file (incomplete trailing record is ignored)
+    @staticmethod
+    def read_records(file_path, dtype):
+        if not os.path.exists(file_path):
+            return np.zeros(0, dtype=dtype)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return np.frombuffer(data[:len(data) // dtype.itemsize * dtype.itemsize], dtype=dtype)
+
+    # Method for loading records of city (from archive files, on first access)
+    def load_city(self, city):
+        if city not in self.daily:
+            daily = hourly = None
+            if self.path is not None:
+                daily = self.read_records(self.city_path(city, 'daily'), DAILY_DTYPE)
+                hourly = self.read_records(self.city_path(city, 'hourly'), HOURLY_DTYPE)
+                # Hourly records of unfinished daily records are dropped (records are stored in order of rows):
+                hourly = hourly[:np.searchsorted(hourly['row'], len(daily))]
+            self.daily[city] = Records(DAILY_DTYPE, daily)
+            self.hourly[city] = Records(HOURLY_DTYPE, hourly)
+        return self.daily[city], self.hourly[city]
+
+    # Method for listing archived cities
+    def cities(self):
+        cities = set(self.daily)
+        if self.path is not None and os.path.isdir(self.path):
+            cities.update(f[:-len('.daily')] for f in os.listdir(self.path) if f.endswith('.daily'))
+        return sorted(cities)
+
+    # Method for parsing WWO value (missing or invalid values are NaN)
+    @staticmethod
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    # # # Method for decoding WWO day payloads into daily and hourly records
+    def decode(self, wwo_days, first_row=0):
+        # wwo_days  - list of WWO day data (parsed JSON)
+        # first_row - row number of the first daily record
+        #
+        # Returns arrays of daily and hourly records (malformed days are skipped and logged)
+
+        daily, hourly = [], []
+        for wwo_day in wwo_days:
+            # Each day is decoded separately, so that a malformed day does not discard the others:
+            try:
+                day = (int(np.datetime64(wwo_day['date'], 'D').astype(np.int64)),) + \
+                    tuple(self.to_float(wwo_day.get(key)) for key in DAILY_FIELDS.values())
+                hours = [(first_row + len(daily), int(h['time']) // 100) +
+                         tuple(self.to_float(h.get(key)) for key in HOURLY_FIELDS.values())
+                         for h in wwo_day.get('hourly', [])]
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                logging.error('Malformed WWO day data (%s: %s)', type(e).__name__, e)
+                continue
+            daily.append(day)
+            hourly.extend(hours)
+
+        return np.array(daily, dtype=DAILY_DTYPE), np.array(hourly, dtype=HOURLY_DTYPE)
+
+    # Method for appending records to archive file
+    @staticmethod
+    def append_records(file_path, stored, records):
+        # file_path - archive file path
+        # stored    - records already stored in the file (Records instance)
+        # records   - appended records
+        #
+        # The file is first truncated to the stored records, so that partially written records (of crashed or
+        # failed appends) are overwritten instead of shifting all later records
+
+        with open(file_path, 'ab') as f:
+            f.truncate(stored.n * stored.data.dtype.itemsize)
+            f.write(records.tobytes())
+
+    # # # Method for appending downloaded WWO day payloads of given city
+    def add_days(self, city, wwo_days):
+        # city     - city name
+        # wwo_days - list of WWO day data (parsed JSON)
+        #
+        # Returns array of row numbers of the appended daily records (malformed days are not appended)
+
+        with self.lock:
+            daily, hourly = self.load_city(city)
+            new_daily, new_hourly = self.decode(wwo_days, daily.n)
+
+            # Append to archive files (daily records first, so hourly records never point past them):
+            if self.path is not None:
+                os.makedirs(self.path, exist_ok=True)
+                self.append_records(self.city_path(city, 'daily'), daily, new_daily)
+                self.append_records(self.city_path(city, 'hourly'), hourly, new_hourly)
+
+            daily.extend(new_daily)
+            hourly.extend(new_hourly)
+            return np.arange(daily.n - len(new_daily), daily.n)
+
+    # Method for getting records of selected daily rows (sorted, latest payload of each day when not given)
+    def select(self, city, rows=None):
+        with self.lock:
+            daily, hourly = self.load_city(city)
+            daily, hourly = daily.values, hourly.values
+
+        if rows is None:
+            # Last occurrence of each day:
+            _, last = np.unique(daily['day'][::-1], return_index=True)
+            rows = len(daily) - 1 - last
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+
+        # Hourly records are stored in order of rows, so only the range spanned by selected rows is scanned
+        # (e.g. just the appended records, when deriving results of a download):
+        lo = np.searchsorted(hourly['row'], rows[0]) if len(rows) else 0
+        hi = np.searchsorted(hourly['row'], rows[-1], side='right') if len(rows) else 0
+        hourly = hourly[lo:hi][np.isin(hourly['row'][lo:hi], rows)]
+
+        # Hourly records of selected rows (and position of their daily record):
+        return daily[rows], hourly, np.searchsorted(rows, hourly['row'])
+
+    # Method for decoding stored values back to float64
+    @staticmethod
+    def values(records, field):
+        return records[field].astype(np.float64).round(DECIMALS[field])
+
+    # # # Method for deriving daily values from archived data (vectorized over all selected days)
+    def daily_frame(self, city, rows=None):
+        # city - city name
+        # rows - row numbers of daily records (in any order, days are returned in order of rows;
+        #        None - latest payload of each archived day)
+        #
+        # Returns DataFrame indexed by date with downloader results (Parser.columns) and additional features:
+        #   cloud_9, cloud_3 - cloud cover at 9am and 3pm [%]
+        #   cloud_mean       - mean cloud cover [%]
+        #   wind_mean        - mean wind speed [km/h]
+        #   precip_max       - maximum precipitation of single hourly entry [mm]
+        #   wet_hours        - number of hours with precipitation [h]
+
+        daily, hourly, pos = self.select(city, rows)
+        n = len(daily)
+
+        # Number of hourly entries per day (days without entries have missing hourly values):
+        count = np.bincount(pos, minlength=n).astype(np.float64)
+        count[count == 0] = np.nan
+
+        def total(values):
+            result = np.bincount(pos, weights=values, minlength=n)
+            result[np.isnan(count)] = np.nan
+            return result
+
+        def maximum(values):
+            result = np.full(n, -np.inf)
+            np.maximum.at(result, pos, values)
+            result[np.isinf(result)] = np.nan
+            return result
+
+        def at_hour(field, hour):
+            result = np.full(n, np.nan)
+            selected = hourly['hour'] == hour
+            result[pos[selected]] = self.values(hourly[selected], field)
+            return result
+
+        precip, wind, cloud = self.values(hourly, 'precip'), self.values(hourly, 'wind'), self.values(hourly, 'cloud')
+
+        df = pd.DataFrame({'min_temp': self.values(daily, 'min_temp'),
+                           'max_temp': self.values(daily, 'max_temp'),
+                           'rain': total(precip).round(1),
+                           'sun': self.values(daily, 'sun'),
+                           'wind': maximum(wind),
+                           'temp_9': at_hour('temp', 9),
+                           'hum_9': at_hour('hum', 9),
+                           'temp_3': at_hour('temp', 15),
+                           'hum_3': at_hour('hum', 15),
+                           'cloud_9': at_hour('cloud', 9),
+                           'cloud_3': at_hour('cloud', 15),
+                           'cloud_mean': total(cloud) / count,
+                           'wind_mean': total(wind) / count,
+                           'precip_max': maximum(precip),
+                           'wet_hours': total((precip > 0).astype(np.float64)) * 24 / count},
+                          index=pd.DatetimeIndex(daily['day'].astype('datetime64[D]'), name='Date'),
+                          columns=['min_temp', 'max_temp', 'rain', 'sun', 'wind', 'temp_9', 'hum_9', 'temp_3',
+                                   'hum_3', 'cloud_9', 'cloud_3', 'cloud_mean', 'wind_mean', 'precip_max',
+                                   'wet_hours'])
+        return df
+
+    # # # Method for deriving downloader results of given daily rows
+    def results(self, city, rows):
+        # city - city name
+        # rows - row numbers of daily records
+        #
+        # Returns dictionary mapping dates ('YYYY-MM-DD') to dictionaries of daily values (as Parser.columns)
+
+        df = self.daily_frame(city, rows)
+        columns = ['min_temp', 'max_temp', 'rain', 'sun', 'wind', 'temp_9', 'temp_3', 'hum_9', 'hum_3']
+        return {date: dict(zip(columns, values))
+                for date, values in zip(df.index.strftime('%Y-%m-%d'), df[columns].values.tolist())}
@@ -0,0 +1,137 @@
+import sqlite3
+import hashlib
+import threading
+import time
+import json
+
+
+class Cache:
+
+    # Method for class initialization:
+    def __init__(self, file_path=None, ttl=None, max_size=None, cache_only=False):
+        # file_path  - path of the SQLite cache file
+        # ttl        - time to live of cached entries [s] (None - entries never expire)
+        # max_size   - maximum total size of cached payloads [bytes] (None - unbounded)
+        # cache_only - offline mode (never go to the network, serve only cached entries)
+
+        self.file_path = file_path or 'data/wwo_cache.sqlite'
+        self.ttl = ttl
+        self.max_size = max_size
+        self.cache_only = cache_only
+
+        # Hit and miss counters:
+        self.hits = 0
+        self.misses = 0
+
+        # Single connection shared between download threads (guarded by lock):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.file_path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, city TEXT, date TEXT, '
+                          'raw TEXT, results TEXT, size INTEGER, created REAL, accessed REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.conn.commit()
+
+        # Current total size of cached payloads:
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    # Method for creating cache key (for given city and date)
+    @staticmethod
+    def make_key(dt, city):
+        # dt   - Datetime object
+        # city - City name
+
+        return hashlib.sha1((city.lower() + '|' + dt.strftime('%Y-%m-%d')).encode()).hexdigest()
+
+    # Method for reading cached entry (returns raw WWO day data and parsed results, or None)
+    def get(self, dt, city):
+        # dt   - Datetime object
+        # city - City name
+
+        key = self.make_key(dt, city)
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute('SELECT raw, results, created FROM responses WHERE key = ?', (key,)).fetchone()
+
+            # Drop expired entry:
+            if row and self.ttl is not None and now - row[2] > self.ttl:
+                self._delete([key])
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            # Update last access time (for LRU eviction):
+            self.conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0]), json.loads(row[1])
+
+    # Method for storing downloaded entry
+    def put(self, dt, city, raw, results):
+        # dt      - Datetime object
+        # city    - City name
+        # raw     - raw WWO day data (parsed JSON)
+        # results - dictionary of extracted daily values
+
+        key = self.make_key(dt, city)
+        raw = json.dumps(raw)
+        results = json.dumps(results)
+        size = len(raw) + len(results)
+        now = time.time()
+
+        with self.lock:
+            # Replace previous entry (if any):
+            self._delete([key])
+            self.conn.execute('INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (key, city, dt.strftime('%Y-%m-%d'), raw, results, size, now, now))
+            self.size += size
+            self.conn.commit()
+
+            # Keep the cache within size limit:
+            if self.max_size is not None and self.size > self.max_size:
+                self._evict()
+
+    # Method for removing expired and least recently used entries
+    def _evict(self):
+        # Remove expired entries:
+        if self.ttl is not None:
+            keys = [k for k, in self.conn.execute('SELECT key FROM responses WHERE created < ?',
+                                                  (time.time() - self.ttl,))]
+            self._delete(keys)
+
+        # Remove least recently used entries, until cache fits the size limit:
+        if self.max_size is not None and self.size > self.max_size:
+            keys = []
+            excess = self.size - self.max_size
+            for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY accessed'):
+                keys.append(key)
+                excess -= size
+                if excess <= 0:
+                    break
+            self._delete(keys)
+
+        self.conn.commit()
+
+    # Method for deleting entries (with size bookkeeping)
+    def _delete(self, keys):
+        for key in keys:
+            row = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row:
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.size -= row[0]
+
+    # Method for removing all cached entries
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
+            self.size = 0
+
+    # Method for reporting cache statistics
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'size': self.size}
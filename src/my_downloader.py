@@ -1,86 +1,367 @@
-import urllib.request
+import urllib.parse
+import email.utils
+import threading
+import random
+import time
+import datetime
 import json
 import logging
 
+import urllib3
+
+from src.my_metrics import metrics
+from src.my_archive import HourlyArchive
+
 logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
 
 
+class RateLimiter:
+
+    # Method for class initialization:
+    def __init__(self, rate=None):
+        # rate - maximum number of requests per second (per host), None for unlimited
+
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    # Method for blocking until the next request slot (for given host) is available
+    def wait(self, host):
+        # host - network location of the request (e.g. 'api.worldweatheronline.com')
+
+        if not self.rate:
+            return
+
+        # Reserve the next free slot for this host (under the lock):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + 1.0 / self.rate
+
+        # Sleep outside of the lock, so other hosts are not blocked:
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CircuitBreaker:
+
+    # Method for class initialization:
+    def __init__(self, threshold=5, reset_timeout=60):
+        # threshold     - number of consecutive failed requests which opens the circuit
+        # reset_timeout - time after which an open circuit lets requests through again [s]
+
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.open_until = None
+
+    # Method for checking whether requests are allowed
+    def allow(self):
+        with self.lock:
+            return self.open_until is None or time.monotonic() >= self.open_until
+
+    # Method for recording successful request (closes the circuit)
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.open_until = None
+
+    # Method for recording failed request (opens the circuit after too many failures)
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.open_until = time.monotonic() + self.reset_timeout
+
+    # Method for opening the circuit for the rest of the run (e.g. exhausted quota or invalid API key)
+    def trip(self):
+        with self.lock:
+            self.open_until = float('inf')
+
+
 class Downloader:
 
-    def __init__(self, wwo_api_key=None):
+    def __init__(self, wwo_api_key=None, wwo_api_url=None, rate_limit=None, cache=None, pool_size=8,
+                 timeout=(3.05, 30), backoff=0.5, max_backoff=30, archive=None):
+        # wwo_api_key - WWO API key
+        # wwo_api_url - WWO past weather endpoint (can be pointed to a local stub server)
+        # rate_limit  - maximum number of requests per second (per host)
+        # cache       - local response cache (Cache class instance, None to disable caching)
+        # pool_size   - number of kept-alive connections (per host)
+        # timeout     - connect and read timeouts [s]
+        # backoff     - base delay of exponential backoff between retries [s]
+        # max_backoff - maximum delay between retries [s]
+        # archive     - hourly archive of downloaded data (HourlyArchive class instance, defaults to memory only)
 
         self.logger = logging
         self.wwo_api_key = wwo_api_key or '6a8fe4b2abaa419a8fe101143180408'
+        self.wwo_api_url = wwo_api_url or 'http://api.worldweatheronline.com/premium/v1/past-weather.ashx'
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.cache = cache
+        self.archive = archive if archive is not None else HourlyArchive()
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker()
 
-    # Method for creating WWO download URL string (for given city and date)
-    def make_wwo_api_str(self, dt, city):
-        # dt   - Datetime object
-        # city - City name
+        # Pooled keep-alive HTTP client (retries are handled by the downloader itself):
+        self.http = urllib3.PoolManager(maxsize=pool_size, timeout=urllib3.Timeout(connect=timeout[0],
+                                                                                   read=timeout[1]),
+                                        retries=False)
 
-        for_str = 'http://api.worldweatheronline.com/premium/v1/past-weather.ashx?key=' + self.wwo_api_key + \
-                  '&q=' + city + '&format=json&date=' + dt.strftime('%Y-%m-%d')
+    # Method for creating WWO download URL string (for given city and date, or date range)
+    def make_wwo_api_str(self, dt, city, end_dt=None):
+        # dt     - Datetime object
+        # city   - City name
+        # end_dt - Datetime object of the last day in range (optional)
+
+        for_str = self.wwo_api_url + '?key=' + self.wwo_api_key + \
+                  '&q=' + urllib.parse.quote(city) + '&format=json&date=' + dt.strftime('%Y-%m-%d')
+        if end_dt is not None and end_dt != dt:
+            for_str += '&enddate=' + end_dt.strftime('%Y-%m-%d')
         return for_str
 
+    # Method for merging dates into minimal list of consecutive date ranges
+    @staticmethod
+    def coalesce_dates(dates):
+        # dates - iterable of Datetime objects
+        #
+        # WWO only serves ranges within a single month, so ranges are also split at month boundaries
+
+        ranges = []
+        for dt in sorted(set(dates)):
+            if ranges:
+                start, end = ranges[-1]
+                if (dt - end).days == 1 and (dt.year, dt.month) == (start.year, start.month):
+                    ranges[-1] = (start, dt)
+                    continue
+            ranges.append((dt, dt))
+        return ranges
+
     # Method for downloading weather data (for given city and date)
-    def get_weather_data(self, dt, city):
-        # dt   - Datetime object
-        # city - City name
+    def get_weather_data(self, dt, city, n_retry=1):
+        # dt      - Datetime object
+        # city    - City name
+        # n_retry - maximum number of download attempts
 
-        results = {}
+        results = self.get_weather_data_range(dt, dt, city, n_retry)
+        return results.get(dt.strftime('%Y-%m-%d')) if results else None
+
+    # Method for downloading weather data (for given city and date range)
+    def get_weather_data_range(self, start_dt, end_dt, city, n_retry=1):
+        # start_dt - Datetime object of the first day in range
+        # end_dt   - Datetime object of the last day in range
+        # city     - City name
+        # n_retry  - maximum number of download attempts
+        #
+        # Returns dictionary mapping dates ('YYYY-MM-DD') to daily results
 
-        # Try to download and parse data:
+        # Create download URL and download data:
+        with metrics.span('wwo.download', city=city):
+            wwo_data = self.fetch_json(self.make_wwo_api_str(start_dt, city, end_dt), n_retry)
+
+        if wwo_data is None:
+            logging.error('Error while downloading weather data for %s (%s - %s)!', city,
+                          start_dt.strftime('%Y-%m-%d'), end_dt.strftime('%Y-%m-%d'))
+            return None
+
+        # Try to parse data:
         try:
-            # Create download URL:
-            wwo_url = self.make_wwo_api_str(dt, city)
-            # Download data from URL:
-            wwo_data = urllib.request.urlopen(wwo_url).read().decode()
-            # Parse the downloaded JSON to dictionary:
-            wwo_data = json.loads(wwo_data)['data']['weather'][0]
-
-            # Parse min and max daily temperature:
-            results['min_temp'] = float(wwo_data['mintempC'])
-            results['max_temp'] = float(wwo_data['maxtempC'])
-            # Parse daily rainfall (by summing daily precipitation):
-            results['rain'] = round(sum([float(k['precipMM']) for k in wwo_data['hourly']]), 1)
-            # Parse daily sunlight hours:
-            results['sun'] = float(wwo_data['sunHour'])
-            # Parse max daily wind speed:
-            results['wind'] = max([float(k['windspeedKmph']) for k in wwo_data['hourly']])
-            # Parse temperatures at 9AM and 3PM:
-            results['temp_9'] = [float(k['tempC']) for k in wwo_data['hourly'] if k['time'] == '900'][0]
-            results['temp_3'] = [float(k['tempC']) for k in wwo_data['hourly'] if k['time'] == '1500'][0]
-            # Parse rel humidity at 9AM and 3PM:
-            results['hum_9'] = [float(k['humidity']) for k in wwo_data['hourly'] if k['time'] == '900'][0]
-            results['hum_3'] = [float(k['humidity']) for k in wwo_data['hourly'] if k['time'] == '1500'][0]
-            # Parse cloud cover at 9AM and 3PM:
-            # results['cloud_9'] = [float(k['cloudcover']) for k in wwo_data['hourly'] if k['time'] == '900'][0]
-            # results['cloud_3'] = [float(k['cloudcover']) for k in wwo_data['hourly'] if k['time'] == '1500'][0]
+            # Decode the response once into the hourly archive and derive per-day results from it (malformed
+            # days are skipped, the rest of the range is kept):
+            wwo_days = wwo_data['data']['weather']
+            rows = self.archive.add_days(city, wwo_days)
+            results = self.archive.results(city, rows)
+            if len(rows) < len(wwo_days):
+                metrics.incr('wwo_parse_errors', len(wwo_days) - len(rows))
+
+            # Days with missing values (e.g. without 9AM or 3PM entry) are neither cached nor returned, so that
+            # they are downloaded again:
+            incomplete = [date for date, day_results in results.items()
+                          if any(value != value for value in day_results.values())]
+            if incomplete:
+                logging.warning('Incomplete weather data for %s (%s)', city, ', '.join(sorted(incomplete)))
+                metrics.incr('wwo_incomplete_days', len(incomplete))
+                for date in incomplete:
+                    del results[date]
 
+            # Store downloaded data to local cache:
+            if self.cache is not None:
+                for wwo_day in wwo_days:
+                    if isinstance(wwo_day, dict) and wwo_day.get('date') in results:
+                        self.cache.put(datetime.datetime.strptime(wwo_day['date'], '%Y-%m-%d'), city, wwo_day,
+                                       results[wwo_day['date']])
+
+            metrics.incr('wwo_days_downloaded', len(results))
             return results
 
         # Catch and log any thrown exceptions:
-        except Exception:
+        except Exception as e:
+
+            logging.error('Error while parsing weather data for %s (%s - %s) - unexpected response format (%s: %s)!',
+                          city, start_dt.strftime('%Y-%m-%d'), end_dt.strftime('%Y-%m-%d'), type(e).__name__, e)
+            metrics.incr('wwo_parse_errors')
+
+            return None
+
+    # Method for downloading JSON response (with status-aware retries, backoff and circuit breaker)
+    def fetch_json(self, url, n_retry=1):
+        # url     - download URL
+        # n_retry - maximum number of download attempts
+        #
+        # Returns parsed JSON dictionary (or None if download failed)
+
+        host = urllib.parse.urlsplit(url).netloc
+
+        for attempt in range(n_retry):
 
-            msg = 'Error while downloading weather data - please check your connection, API key, city name, date and download limit!\n'
+            # Stop immediately while the circuit is open:
+            if not self.breaker.allow():
+                logging.error('WWO requests suspended - too many failures or download limit exhausted!')
+                metrics.incr('wwo_suspended')
+                return None
 
-            # msg += 'API:\t'+self.wwo_api_key+'\n'
-            # msg += 'City:\t'+city+'\n'
-            # msg += 'Date:\t'+dt.strftime('%Y-%m-%d')+'\n'
+            if attempt > 0:
+                metrics.incr('wwo_retries')
 
-            # msg += str(Exception)
+            # Respect the per-host request rate:
+            self.rate_limiter.wait(host)
 
-            logging.error(msg)
+            retry_after = None
 
+            # Download data from URL:
+            start = time.perf_counter()
+            try:
+                response = self.http.request('GET', url)
+            except urllib3.exceptions.HTTPError as e:
+                # Connection errors and timeouts are transient:
+                logging.warning('WWO request failed (%s) - attempt %d of %d', type(e).__name__, attempt + 1, n_retry)
+                metrics.incr('wwo_requests', status=type(e).__name__)
+                self.breaker.record_failure()
+            else:
+                metrics.observe('wwo_request_seconds', time.perf_counter() - start)
+                metrics.incr('wwo_requests', status=response.status)
+                if response.status == 200:
+                    try:
+                        data = json.loads(response.data.decode())
+                        error = data['data'].get('error')
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        logging.error('WWO response is not valid weather data')
+                        return None
+                    # WWO reports invalid requests (and exhausted quota) with 200 status:
+                    if error:
+                        msg = error[0].get('msg', '')
+                        logging.error('WWO error: %s', msg)
+                        if 'limit' in msg.lower() or 'key' in msg.lower():
+                            self.breaker.trip()
+                        return None
+                    self.breaker.record_success()
+                    return data
+
+                if response.status == 429 or response.status >= 500:
+                    # Rate limiting and server errors are transient:
+                    logging.warning('WWO request failed (HTTP %d) - attempt %d of %d', response.status, attempt + 1,
+                                    n_retry)
+                    self.breaker.record_failure()
+                    retry_after = self.parse_retry_after(response.headers.get('Retry-After'))
+                else:
+                    # Other client errors are permanent (invalid API key, city or date):
+                    logging.error('WWO request rejected (HTTP %d)', response.status)
+                    if response.status in (401, 403):
+                        self.breaker.trip()
+                    return None
+
+            # Wait before trying again (jittered exponential backoff, or server requested delay):
+            if attempt + 1 < n_retry:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                time.sleep(delay)
+
+        return None
+
+    # Method for parsing Retry-After header (seconds or HTTP date) into delay [s]
+    @staticmethod
+    def parse_retry_after(value):
+        # value - Retry-After header value (or None)
+
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            dt = email.utils.parsedate_to_datetime(value)
+            return max(0.0, dt.timestamp() - time.time())
+        except (TypeError, ValueError):
             return None
 
+    # Method for extracting relevant daily values from WWO day data
+    @staticmethod
+    def parse_wwo_data(wwo_data):
+        # wwo_data - WWO day data (parsed JSON)
+        #
+        # Values are derived the same way as from the hourly archive (missing values are NaN)
+
+        archive = HourlyArchive()
+        rows = archive.add_days('', [wwo_data])
+        return list(archive.results('', rows).values())[0]
+
     # Method for downloading weather data with retries
     def get_weather_data_with_retry(self, dt, city, n_retry=3):
-        # Try to download data n_retry times
-        for _ in range(n_retry):
-            results = self.get_weather_data(dt, city)
-            # If successfully downloaded - return data
-            if results:
-                break
-            # Else try again
+        # Check the local cache first:
+        if self.cache is not None:
+            cached = self.cache.get(dt, city)
+            metrics.incr('wwo_cache_hits' if cached else 'wwo_cache_misses')
+            if cached:
+                return cached[1]
+            # In offline mode - never go to the network:
+            if self.cache.cache_only:
+                return None
+
+        return self.get_weather_data(dt, city, n_retry)
+
+    # Method for downloading weather data for multiple dates (with range requests and retries)
+    def get_weather_data_dates(self, dates, city, n_retry=3):
+        # dates - iterable of Datetime objects
+        # city  - City name
+        #
+        # Returns dictionary mapping dates ('YYYY-MM-DD') to daily results
+
+        results = {}
+        missing = []
+
+        # Check the local cache first:
+        for dt in dates:
+            cached = self.cache.get(dt, city) if self.cache is not None else None
+            if cached:
+                results[dt.strftime('%Y-%m-%d')] = cached[1]
+            else:
+                missing.append(dt)
+
+        if self.cache is not None:
+            metrics.incr('wwo_cache_hits', len(results))
+            metrics.incr('wwo_cache_misses', len(missing))
+
+        # In offline mode - never go to the network:
+        if self.cache is not None and self.cache.cache_only:
+            return results
+
+        # Download remaining dates with minimal number of range requests:
+        failed = []
+        for start_dt, end_dt in self.coalesce_dates(missing):
+            range_results = self.get_weather_data_range(start_dt, end_dt, city, n_retry)
+            # If successfully downloaded - keep data (and remember days which could not be parsed)
+            if range_results is not None:
+                results.update(range_results)
+                failed += [dt for dt in missing if start_dt <= dt <= end_dt and
+                           dt.strftime('%Y-%m-%d') not in range_results]
+
+        # Download days which could not be parsed once more (only these days, not their whole ranges):
+        for start_dt, end_dt in self.coalesce_dates(failed):
+            range_results = self.get_weather_data_range(start_dt, end_dt, city, n_retry)
+            if range_results:
+                results.update(range_results)
 
         return results
@@ -0,0 +1,153 @@
+import functools
+import hashlib
+
+import pandas as pd
+import numpy as np
+
+# Dew point calculation constants:
+DEW_B = 18.678
+DEW_C = 257.14
+DEW_D = 234.5
+
+# Ranges of the dew point lookup table (relative humidity and temperature in steps of 0.1):
+DEW_RH_STEPS = 1000  # 0 % ... 100 %
+DEW_T_STEPS = (-600, 600)  # -60 *C ... 60 *C
+
+
+# Function for calculating meteorological dew point (directly from the formula)
+def dew_formula(RH, T):
+    # The calculation is based on dew point equations presented on
+    # https://en.wikipedia.org/wiki/Dew_point#Calculating_the_dew_point
+    #
+    # RH - relative humidity array [ % ]
+    # T  - air temperature array   [* C]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Gamma parameter calculation:
+        g_m = np.log(RH / 100 * np.exp((DEW_B - T / DEW_D) * (T / (DEW_C + T))))
+
+        # Dew point calculation:
+        return np.round(DEW_C * g_m / (DEW_B - g_m), 1)
+
+
+# Function for building dew point lookup table (computed once, shared by all stations)
+@functools.lru_cache(maxsize=None)
+def dew_table():
+    rh = np.arange(0, DEW_RH_STEPS + 1) / 10
+    t = np.arange(DEW_T_STEPS[0], DEW_T_STEPS[1] + 1) / 10
+    return dew_formula(rh[:, None], t[None, :])
+
+
+# Function for calculating dew point (table lookup for one-decimal values, formula for all others)
+def calc_dew(RH, T):
+    # RH - relative humidity vector (or scalar) [ % ]
+    # T  - air temperature vector (or scalar)   [* C]
+
+    rh, t = np.broadcast_arrays(np.asarray(RH, dtype=np.float64), np.asarray(T, dtype=np.float64))
+
+    # Table indices (valid only for values lying exactly on the table grid):
+    with np.errstate(invalid='ignore'):
+        i = np.rint(rh * 10)
+        j = np.rint(t * 10)
+        on_grid = ((i / 10 == rh) & (j / 10 == t) & (i >= 0) & (i <= DEW_RH_STEPS) &
+                   (j >= DEW_T_STEPS[0]) & (j <= DEW_T_STEPS[1]))
+
+    dew = np.empty(rh.shape)
+    dew[on_grid] = dew_table()[i[on_grid].astype(np.int64), j[on_grid].astype(np.int64) - DEW_T_STEPS[0]]
+    dew[~on_grid] = dew_formula(rh[~on_grid], t[~on_grid])
+
+    if isinstance(RH, pd.Series):
+        return pd.Series(dew, index=RH.index)
+    # Scalar inputs give scalar dew point (as with the formula):
+    return dew if dew.ndim else dew[()]
+
+
+# Function for building daylight length lookup table (per latitude, shared by all years and stations)
+@functools.lru_cache(maxsize=None)
+def daylight_table(geo_lat):
+    # The calculation is based on sunrise equations presented on
+    # https://en.wikipedia.org/wiki/Sunrise_equation
+    #
+    # geo_lat - geographical latitude [deg]
+    #
+    # Returns daylight lengths [h], indexed by day of the year (1 - 366)
+
+    day_of_year = np.arange(367)
+
+    with np.errstate(invalid='ignore'):
+        # Calculate solar declination:
+        dec = -23.45 * np.pi / 180 * np.cos(2 * np.pi * (day_of_year + 10) / 365)
+
+        # Calculate daylight length:
+        return np.arccos(-np.tan(geo_lat * np.pi / 180) * np.tan(dec)) * 24 / np.pi
+
+
+# Function for calculating daily sunlight percentage
+def calc_sun_perc(day_of_year, sun_hour, geo_lat):
+    # day_of_year - day of the year vector      [ / ]
+    # sun_hour    - daily sunlight hours vector [ h ]
+    # geo_lat     - geographical latitude       [deg]
+
+    # Look up daylight length:
+    day_len = daylight_table(float(geo_lat))[np.asarray(day_of_year)]
+
+    # Normalize sunlit hours with daylight length to get sunlight percentage:
+    return (sun_hour / day_len * 100).round(1).clip(lower=0, upper=100)
+
+
+class DerivedFeatures:
+
+    # Derived features (source columns and calculation function):
+    definitions = {
+        'dew_9': (['hum_9', 'temp_9'], lambda df, lat: calc_dew(df.hum_9, df.temp_9)),
+        'dew_3': (['hum_3', 'temp_3'], lambda df, lat: calc_dew(df.hum_3, df.temp_3)),
+        'day_len': ([], lambda df, lat: pd.Series(daylight_table(float(lat))[df.index.dayofyear],
+                                                  index=df.index)),
+        'sun_perc': (['sun'], lambda df, lat: calc_sun_perc(df.index.dayofyear, df.sun, lat)),
+    }
+
+    # Method for class initialization:
+    def __init__(self, df, latitude):
+        # df       - DataFrame with source columns (indexed by date)
+        # latitude - geographical latitude of the station [deg]
+
+        self.df = df
+        self.latitude = latitude
+        self.cache = {}
+
+    # Method for accessing derived feature (computed on first access, then cached while its sources are unchanged)
+    def __getitem__(self, name):
+        sources, func = self.definitions[name]
+        stamp = self.stamp(sources)
+
+        cached = self.cache.get(name)
+        if cached is None or cached[0] != stamp:
+            cached = self.cache[name] = (stamp, func(self.df, self.latitude))
+
+        return cached[1]
+
+    # Method for creating stamp of source columns (content hash of the index and source columns, so that replaced
+    # as well as in-place edited sources are noticed)
+    def stamp(self, sources):
+        h = hashlib.sha1(np.ascontiguousarray(self.df.index.values).tobytes())
+        for col in sources:
+            h.update(np.ascontiguousarray(self.df[col].values).tobytes())
+        return h.hexdigest()
+
+    # Method for dropping cached features (depending on given source columns, or all features)
+    def invalidate(self, columns=None):
+        # columns - list of changed source columns (None - invalidate all features)
+
+        for name in list(self.cache):
+            if columns is None or set(columns) & set(self.definitions[name][0]):
+                del self.cache[name]
+
+    # Method for replacing source DataFrame (cached features are kept while their source columns are unchanged)
+    def set_source(self, df, latitude):
+        # df       - DataFrame with source columns (indexed by date)
+        # latitude - geographical latitude of the station [deg] (changed latitude drops all cached features)
+
+        if latitude != self.latitude:
+            self.cache = {}
+        self.df = df
+        self.latitude = latitude
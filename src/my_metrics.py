@@ -0,0 +1,263 @@
+import functools
+import threading
+import json
+import time
+import sys
+import os
+import re
+
+# Default histogram buckets (upper bounds) of durations [s]:
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+
+class NullSpan:
+    # Span used while metrics are disabled (does nothing)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    # Timing span (duration is recorded on exit)
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        self.duration = time.perf_counter() - self.start
+        self.metrics.record_span(self.name, self.duration, self.labels, failed=exc_type is not None)
+        return False
+
+
+class Metrics:
+    # Registry of timing spans, counters and histograms (all methods are no-ops while disabled)
+
+    # Method for class initialization:
+    def __init__(self, enabled=False, exporters=None):
+        # enabled   - record metrics
+        # exporters - list of exporters (see JsonLogExporter and PrometheusExporter)
+
+        self.enabled = enabled
+        self.exporters = list(exporters or [])
+        self.lock = threading.Lock()
+        self.reset()
+
+    # Method for enabling recording (with given exporters)
+    def enable(self, exporters=None):
+        self.exporters = list(exporters or self.exporters)
+        self.enabled = True
+
+    # Method for disabling recording
+    def disable(self):
+        self.enabled = False
+
+    # Method for dropping all recorded values
+    def reset(self):
+        with self.lock:
+            # Dictionaries mapping (name, labels) keys to recorded values:
+            self.counters = {}
+            self.histograms = {}
+            self.spans = {}
+
+    # Method for creating hashable key of metric name and labels
+    @staticmethod
+    def make_key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    # # # Method for timing block of code (e.g. 'with metrics.span('parse.fill', city=city):')
+    def span(self, name, **labels):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, labels)
+
+    # # # Method for increasing counter
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self.make_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    # # # Method for recording histogram observation
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = self.make_key(name, labels)
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0,
+                                               'count': 0}
+            for k, bound in enumerate(buckets):
+                if value <= bound:
+                    hist['counts'][k] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+
+    # Method for recording finished span (called by Span)
+    def record_span(self, name, duration, labels, failed=False):
+        key = self.make_key(name, labels)
+        with self.lock:
+            span = self.spans.get(key)
+            if span is None:
+                span = self.spans[key] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'failed': 0}
+            span['count'] += 1
+            span['sum'] += duration
+            span['max'] = max(span['max'], duration)
+            span['failed'] += failed
+
+        for exporter in self.exporters:
+            exporter.on_span(name, duration, labels, failed)
+
+    # # # Method for getting copy of all recorded values
+    def snapshot(self):
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {key: dict(hist, counts=list(hist['counts']))
+                                   for key, hist in self.histograms.items()},
+                    'spans': {key: dict(span) for key, span in self.spans.items()}}
+
+    # # # Method for exporting recorded values (with all exporters)
+    def export(self):
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshot)
+
+
+# Default registry of the package (disabled until enabled, e.g. by main.py)
+metrics = Metrics()
+
+
+# Decorator for timing whole function (span is created at call time, so it follows enabling and disabling)
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with metrics.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class JsonLogExporter:
+    # Structured log exporter (one JSON object per line - each finished span, and recorded totals on export)
+
+    # Method for class initialization:
+    def __init__(self, file_path=None):
+        # file_path - log file (None - standard error output)
+
+        self.file_path = file_path
+        self.lock = threading.Lock()
+
+    # Method for writing single log record
+    def write(self, record):
+        line = json.dumps(record, sort_keys=True, default=str) + '\n'
+        with self.lock:
+            if self.file_path is None:
+                sys.stderr.write(line)
+            else:
+                with open(self.file_path, 'a') as f:
+                    f.write(line)
+
+    def on_span(self, name, duration, labels, failed):
+        self.write({'time': time.time(), 'event': 'span', 'name': name, 'duration': round(duration, 6),
+                    'labels': labels, 'failed': failed})
+
+    def export(self, snapshot):
+        self.write({'time': time.time(), 'event': 'metrics',
+                    'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                                 for (name, labels), value in snapshot['counters'].items()],
+                    'histograms': [dict(hist, name=name, labels=dict(labels),
+                                        buckets=[str(b) for b in hist['buckets']])
+                                   for (name, labels), hist in snapshot['histograms'].items()],
+                    'spans': [dict(span, name=name, labels=dict(labels))
+                              for (name, labels), span in snapshot['spans'].items()]})
+
+
+class PrometheusExporter:
+    # Prometheus text file exporter (e.g. for the node exporter textfile collector)
+
+    # Method for class initialization:
+    def __init__(self, file_path, prefix='meteo'):
+        # file_path - output file (written atomically on each export)
+        # prefix    - prefix of all metric names
+
+        self.file_path = file_path
+        self.prefix = prefix
+
+    def on_span(self, name, duration, labels, failed):
+        pass
+
+    # Method for creating Prometheus metric name
+    def metric_name(self, name, suffix=''):
+        return re.sub(r'[^a-zA-Z0-9_]', '_', self.prefix + '_' + name) + suffix
+
+    # Method for formatting label set
+    @staticmethod
+    def format_labels(labels, **extra):
+        labels = list(labels) + sorted((k, str(v)) for k, v in extra.items())
+        if not labels:
+            return ''
+        return '{' + ','.join('%s="%s"' % (k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+    def export(self, snapshot):
+        lines = []
+        types = set()
+
+        def declare(name, kind):
+            if name not in types:
+                types.add(name)
+                lines.append('# TYPE %s %s' % (name, kind))
+
+        for (name, labels), value in sorted(snapshot['counters'].items()):
+            metric = self.metric_name(name, '_total')
+            declare(metric, 'counter')
+            lines.append('%s%s %s' % (metric, self.format_labels(labels), value))
+
+        for (name, labels), hist in sorted(snapshot['histograms'].items()):
+            metric = self.metric_name(name)
+            declare(metric, 'histogram')
+            cumulative = 0
+            for bound, count in zip(hist['buckets'], hist['counts']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket%s %d' % (metric, self.format_labels(labels, le=le), cumulative))
+            lines.append('%s_sum%s %r' % (metric, self.format_labels(labels), hist['sum']))
+            lines.append('%s_count%s %d' % (metric, self.format_labels(labels), hist['count']))
+
+        # Each metric family must be one contiguous group (summaries of all label sets of a span, then maxima):
+        spans = sorted(snapshot['spans'].items())
+        for name in sorted(set(name for (name, _), _ in spans)):
+            metric = self.metric_name(name, '_seconds')
+            selected = [(labels, span) for (span_name, labels), span in spans if span_name == name]
+            declare(metric, 'summary')
+            for labels, span in selected:
+                lines.append('%s_sum%s %r' % (metric, self.format_labels(labels), span['sum']))
+                lines.append('%s_count%s %d' % (metric, self.format_labels(labels), span['count']))
+            declare(metric + '_max', 'gauge')
+            for labels, span in selected:
+                lines.append('%s_max%s %r' % (metric, self.format_labels(labels), span['max']))
+
+        # Write to temporary file first (collectors never see partially written file):
+        os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.file_path)
@@ -1,84 +1,383 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import hashlib
+import json
+import os
+
 import pandas as pd
 import numpy as np
 
-from src.my_downloader import Downloader
+from src.my_storage import get_storage
+from src.my_metrics import metrics, timed
+import src.my_features as features
 
 
 class Parser:
 
+    # Relevant columns of the original data (and their short names):
+    source_columns = ['Minimum temperature (°C)', 'Maximum temperature (°C)', 'Rainfall (mm)', 'Sunshine (hours)',
+                      'Speed of maximum wind gust (km/h)', '9am Temperature (°C)', '9am relative humidity (%)',
+                      '3pm Temperature (°C)', '3pm relative humidity (%)']
+    columns = ['min_temp', 'max_temp', 'rain', 'sun', 'wind', 'temp_9', 'hum_9', 'temp_3', 'hum_3']
+
     # # # Method for class initialization:
-    def __init__(self, cities=None, latitudes=None, excel_file=None):
+    def __init__(self, cities=None, latitudes=None, excel_file=None, n_workers=None, rate_limit=None,
+                 wwo_api_url=None, cache=None, n_city_workers=None, longitudes=None, archive=None):
+        # n_workers      - maximum number of concurrent WWO downloads (while filling missing values)
+        # rate_limit     - maximum number of WWO requests per second
+        # wwo_api_url    - WWO past weather endpoint (e.g. local stub server)
+        # cache          - local WWO response cache (Cache class instance, defaults to 'data/wwo_cache.sqlite')
+        # n_city_workers - maximum number of cities processed in parallel
+        # longitudes     - geographical longitudes of the cities (for spatial queries)
+        # archive        - hourly archive of WWO downloads (HourlyArchive class instance,
+        #                  defaults to 'data/wwo_archive/')
         self.cities = cities or ['Melbourne', 'Sydney', 'Adelaide', 'Brisbane', 'Perth']
         self.latitudes = latitudes or [-37.8136, -33.8688, -34.9285, -27.4698, -31.9505]
+        self.longitudes = longitudes or [144.9631, 151.2093, 138.6007, 153.0251, 115.8605]
         self.excel_file = excel_file or 'data/Meteorological Data.xlsx'
-        self.downloader = Downloader()
+        self.n_workers = n_workers or 8
+        self.n_city_workers = n_city_workers or min(len(self.cities), os.cpu_count() or 1)
+        # Derived features of cities (one instance per city, so that cached features are reused between runs):
+        self.features = {}
+        # WWO downloader settings (the downloader is created on first use, so that parsing of complete data and
+        # loading of parsed data do not import the HTTP stack or open the cache):
+        self.wwo_api_url = wwo_api_url
+        self.rate_limit = rate_limit
+        self.cache = cache
+        self.archive = archive
+        self._downloader = None
+        self._downloader_lock = threading.Lock()
+
+    # # # WWO downloader (created on first access)
+    @property
+    def downloader(self):
+        if self._downloader is None:
+            with self._downloader_lock:
+                if self._downloader is None:
+                    from src.my_downloader import Downloader
+                    from src.my_cache import Cache
+                    from src.my_archive import HourlyArchive
+                    self._downloader = Downloader(wwo_api_url=self.wwo_api_url, rate_limit=self.rate_limit,
+                                                  cache=self.cache or Cache(), pool_size=self.n_workers,
+                                                  archive=self.archive or HourlyArchive('data/wwo_archive'))
+        return self._downloader
 
     # # # Method for parse meteorological data (loading, filling and processing)
-    def parse_data(self, save=True):
+    def parse_data(self, save=True, incremental=False):
+        # save        - save parsed data to storage
+        # incremental - only process new and changed rows (reusing previously parsed data)
+
+        # Load all Excel sheets (in a single pass over the workbook):
+        sheets = self.load_excel_sheets(list(range(len(self.cities))), self.excel_file)
 
-        dfs = {}
+        dfs, updated, manifest = self.parse_cities({city: sheets[k] for k, city in enumerate(self.cities)}, incremental)
 
-        # For each city:
-        for k, city in enumerate(self.cities):
+        # Save parsed data (only new or changed cities) and manifest to storage (optionally)
+        if save:
+            self.save_parsed(updated, manifest)
 
-            # Load the corresponding Excel sheet into Pandas DF:
-            df = self.load_excel_sheet(k, self.excel_file)
+        return dfs
 
-            # Fill all missing values (download from WWO database):
+    # # # Method for parsing DFs of given cities (in parallel, fully or incrementally)
+    def parse_cities(self, sheets, incremental=False, derive=True):
+        # sheets      - dictionary mapping cities to DataFrames loaded from Excel sheets
+        # incremental - only process new and changed rows (reusing previously parsed data)
+        # derive      - compute derived values (False - only fill missing values, e.g. when deriving separately)
+        #
+        # Returns dictionaries of parsed DFs, updated DFs (new or changed cities) and manifest entries (of all
+        # cities in the manifest)
+
+        storage = get_storage()
+        stored = storage.cities() if incremental and storage.exists() else []
+        manifest = self.load_manifest().get('cities', {}) if incremental else {}
+        cities = list(sheets)
+
+        # Process all cities (in parallel):
+        with metrics.span('parse.cities'), ThreadPoolExecutor(max_workers=self.n_city_workers) as pool:
+            results = list(pool.map(lambda city: self.update_city(sheets[city], city,
+                                                                  self.latitudes[self.cities.index(city)],
+                                                                  storage if city in stored else None,
+                                                                  manifest.get(city), derive),
+                                    cities))
+
+        # Collect parsed DFs, updated DFs and manifest entries (for all cities):
+        dfs = {city: res[0] for city, res in zip(cities, results)}
+        updated = {city: res[0] for city, res in zip(cities, results) if res[1]}
+        manifest.update({city: res[2] for city, res in zip(cities, results)})
+
+        return dfs, updated, manifest
+
+    # # # Method for saving parsed DFs and manifest (with stamp of the current source workbook)
+    def save_parsed(self, dfs, manifest):
+        # dfs      - dictionary mapping (new or changed) cities to parsed DataFrames
+        # manifest - dictionary mapping cities to manifest entries
+
+        self.save_parsed_dfs(dfs)
+        self.save_manifest({'source': self.source_stamp(), 'cities': manifest})
+
+    # # # Method for parsing single city DF (fully, or incrementally when stored data is provided)
+    def update_city(self, df, city, latitude, storage=None, entry=None, derive=True):
+        # df       - DataFrame loaded from Excel sheet
+        # city     - city name
+        # latitude - geographical latitude of the city [deg]
+        # storage  - storage with previously parsed data (None - parse all rows)
+        # entry    - manifest entry from the last run
+        # derive   - compute derived values (False - only fill missing values, stored rows without derived values)
+        #
+        # Returns parsed DF, flag whether it differs from stored data and new manifest entry
+
+        # Compute source hashes (per month of data):
+        hashes = self.hash_months(df)
+
+        # Select rows which have to be processed (all rows, or only new and changed ones):
+        df_old = None
+        if storage is not None:
+            df_old = storage.load_city(city)
+            n_stored = len(df_old)
+            changed = self.find_changed_rows(df, hashes, df_old, entry, latitude)
+            df_old = df_old[~df_old.index.isin(df.index[changed]) & df_old.index.isin(df.index)]
+            if not derive:
+                df_old = df_old[df.columns]
+            df = df[changed]
+
+        # Fill, and compute derived values when requested (for selected rows only), then merge with previously
+        # parsed rows:
+        if df_old is None:
+            df = self.parse_city(df, city, latitude, derive)
+            updated = True
+        elif len(df) > 0:
+            df = self.parse_city(df, city, latitude, derive)
+            df = pd.concat([df_old, df[df_old.columns]]).sort_index()
+            updated = True
+        else:
+            df = df_old
+            # Rows removed from the original data also have to be removed from storage:
+            updated = len(df) < n_stored
+
+        entry = {'latitude': latitude, 'last_date': df.index.max().strftime('%Y-%m-%d'), 'hashes': hashes}
+
+        return df, updated, entry
+
+    # # # Method for checking whether saved parsed data matches the current source workbook
+    def is_up_to_date(self):
+        return self.load_manifest().get('source') == self.source_stamp()
+
+    # # # Method for creating source workbook stamp (modification time and size)
+    def source_stamp(self):
+        stat = os.stat(self.excel_file)
+        return {'file': self.excel_file, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    # # # Method for filling and processing single city DF
+    def parse_city(self, df, city, latitude, derive=True):
+        # df       - DataFrame loaded from Excel sheet
+        # city     - city name
+        # latitude - geographical latitude of the city [deg]
+        # derive   - compute derived values (False - return filled DF)
+
+        # Fill all missing values (download from WWO database):
+        with metrics.span('parse.fill', city=city):
             df = self.fill_df(df, city)
 
-            # Calculate dew points at 9am and 3pm:
-            df = df.assign(dew_9=self.calc_dew(df.hum_9, df.temp_9))
-            df = df.assign(dew_3=self.calc_dew(df.hum_3, df.temp_3))
+        # Compute derived values:
+        return self.derive_df(df, latitude, self.city_features(city, df, latitude)) if derive else df
 
-            # Calculate daily sunlight percentage:
-            df = df.assign(sun_perc=self.calc_sun_perc(df.index.dayofyear, df.sun, self.latitudes[k]))
+    # # # Method for getting derived features of given city (created on first use, then its source is replaced)
+    def city_features(self, city, df, latitude):
+        # city     - city name
+        # df       - filled DataFrame
+        # latitude - geographical latitude of the city [deg]
 
-            # Add the created DF (for given city) to dictionary:
-            dfs[city] = df
+        derived = self.features.get(city)
+        if derived is None:
+            derived = self.features[city] = features.DerivedFeatures(df, latitude)
+        else:
+            derived.set_source(df, latitude)
+        return derived
 
-        # Save parsed data to new Excel file (optionally)
-        if save:
-            self.save_parsed_dfs(dfs)
+    # # # Method for computing derived values (dew points and sunlight percentage) of filled DF
+    @staticmethod
+    @timed('parse.derive')
+    def derive_df(df, latitude, derived=None):
+        # df       - filled DataFrame
+        # latitude - geographical latitude of the city [deg]
+        # derived  - derived features of the city (DerivedFeatures instance with source df, see city_features;
+        #            None - features are computed once)
 
-        return dfs
+        # Derived features (computed lazily, from lookup tables):
+        if derived is None:
+            derived = features.DerivedFeatures(df, latitude)
+
+        # Calculate dew points at 9am and 3pm, and daily sunlight percentage:
+        return df.assign(dew_9=derived['dew_9'], dew_3=derived['dew_3'], sun_perc=derived['sun_perc'])
 
-    # # # Method for saving parsed DFs to Excel file
+    # # # Method for computing source data hashes (one hash per month of data)
     @staticmethod
-    def save_parsed_dfs(dfs, file_path='data/updated_meteo_data.xlsx'):
-        # Initialize Excel writer:
-        writer = pd.ExcelWriter(file_path, engine='xlsxwriter')
-        # Include all cities to the writer:
-        for city in dfs:
-            dfs[city].to_excel(writer, sheet_name=city)
-        # Saved to provided file path:
-        writer.save()
-
-    # # # Method for loading parsed DFs from Excel file
+    def hash_months(df):
+        # df - DataFrame loaded from Excel sheet
+
+        row_hashes = pd.util.hash_pandas_object(df, index=True)
+        months = df.index.strftime('%Y-%m')
+        return {month: hashlib.sha1(h.values.tobytes()).hexdigest() for month, h in row_hashes.groupby(months)}
+
+    # # # Method for finding rows which are new or changed since the last run (boolean mask)
+    @staticmethod
+    def find_changed_rows(df, hashes, df_old, entry, latitude):
+        # df       - DataFrame loaded from Excel sheet
+        # hashes   - current source hashes (per month)
+        # df_old   - previously parsed DataFrame
+        # entry    - manifest entry from the last run (None if the city has no manifest entry)
+        # latitude - current latitude of the city [deg]
+
+        months = df.index.strftime('%Y-%m')
+
+        # Without manifest entry, trust the previously parsed rows (up to the last processed date):
+        if entry is None:
+            changed = ~df.index.isin(df_old.index)
+        # Changed latitude invalidates all derived values:
+        elif entry['latitude'] != latitude:
+            changed = np.ones(len(df), dtype=bool)
+        # Otherwise, reprocess months with new or changed source data:
+        else:
+            old_hashes = entry['hashes']
+            changed_months = [m for m in hashes if old_hashes.get(m) != hashes[m]]
+            changed = months.isin(changed_months)
+
+        # Also retry months which still contain unfilled values (e.g. failed downloads):
+        unfilled = df_old.index[df_old.isnull().any(axis=1).values].strftime('%Y-%m')
+        changed = changed | months.isin(unfilled)
+
+        return np.asarray(changed)
+
+    # # # Method for loading the incremental parsing manifest
+    @staticmethod
+    def load_manifest(file_path=None):
+        file_path = file_path or os.path.join(get_storage().path, 'manifest.json')
+        if not os.path.exists(file_path):
+            return {}
+        with open(file_path) as f:
+            return json.load(f)
+
+    # # # Method for saving the incremental parsing manifest
     @staticmethod
-    def load_parsed_dfs(file_path='data/updated_meteo_data.xlsx'):
-        dfs = pd.read_excel(file_path, sheet_name=None, index_col='Date')
-        return dict(dfs)
+    def save_manifest(manifest, file_path=None):
+        file_path = file_path or os.path.join(get_storage().path, 'manifest.json')
+        with open(file_path, 'w') as f:
+            json.dump(manifest, f)
+
+    # # # Method for saving parsed DFs (Parquet by default, Feather or Excel export optionally)
+    @staticmethod
+    @timed('storage.save')
+    def save_parsed_dfs(dfs, file_path=None, fmt='parquet'):
+        # file_path - storage path (None - default path of given format)
+        # fmt       - storage format ('parquet', 'feather' or 'xlsx')
+        get_storage(fmt, file_path).save(dfs)
+
+    # # # Method for loading parsed DFs
+    @staticmethod
+    @timed('storage.load')
+    def load_parsed_dfs(file_path=None, fmt='parquet', cities=None, columns=None, schema=None):
+        # file_path - storage path (None - default path of given format)
+        # fmt       - storage format ('parquet', 'feather' or 'xlsx')
+        # cities    - list of cities to load (None - all stored cities)
+        # columns   - list of columns to load (None - all columns)
+        # schema    - CompactSchema instance (None - keep loaded dtypes)
+        dfs = get_storage(fmt, file_path).load(cities, columns)
+        return schema.compact_dfs(dfs) if schema is not None else dfs
+
+    # # # Method for checking whether parsed DFs were already saved
+    @staticmethod
+    def parsed_dfs_exist(file_path=None, fmt='parquet'):
+        return get_storage(fmt, file_path).exists()
 
     # # # Method for loading provided Excel data into Pandas DataFrame
     @staticmethod
     def load_excel_sheet(sheet_no, file_path):
         # sheet_no - number of the sheet to be read
 
-        # Read-in DataFrame from excel sheet:
-        df = pd.read_excel(file_path, sheet_name=sheet_no)
+        return Parser.load_excel_sheets([sheet_no], file_path)[sheet_no]
+
+    # # # Method for loading multiple Excel sheets into Pandas DataFrames (in a single pass over the workbook)
+    @staticmethod
+    @timed('parse.load_excel')
+    def load_excel_sheets(sheets, file_path):
+        # sheets - list of sheet numbers (or names) to be read
+        #
+        # Returns dictionary mapping sheets to DataFrames
+
+        # Read-in relevant columns from all excel sheets:
+        dfs = pd.read_excel(file_path, sheet_name=sheets, usecols=['Date'] + Parser.source_columns)
+
+        return {sheet: Parser.prepare_sheet(df) for sheet, df in dfs.items()}
+
+    # # # Method for streaming Excel sheet in DataFrame chunks (with bounded memory)
+    @staticmethod
+    def iter_excel_chunks(sheet, file_path, chunk_size=10000):
+        # sheet      - number (or name) of the sheet to be read
+        # chunk_size - number of rows per chunk
+
+        from openpyxl import load_workbook
+
+        # Open workbook in read-only (streaming) mode:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+            rows = ws.iter_rows(values_only=True)
+
+            # Find positions of relevant columns in the header:
+            header = list(next(rows))
+            names = ['Date'] + Parser.source_columns
+            positions = [header.index(name) for name in names]
+
+            # Collect rows into chunks:
+            chunk = []
+            for row in rows:
+                chunk.append([row[i] for i in positions])
+                if len(chunk) == chunk_size:
+                    yield Parser.prepare_sheet(pd.DataFrame(chunk, columns=names, dtype=object))
+                    chunk = []
+            if chunk:
+                yield Parser.prepare_sheet(pd.DataFrame(chunk, columns=names, dtype=object))
+        finally:
+            wb.close()
+
+    # # # Method for streaming CSV file in DataFrame chunks (with bounded memory)
+    @staticmethod
+    def iter_csv_chunks(file_path, chunk_size=10000):
+        # chunk_size - number of rows per chunk
+
+        for df in pd.read_csv(file_path, usecols=['Date'] + Parser.source_columns, chunksize=chunk_size):
+            yield Parser.prepare_sheet(df)
+
+    # # # Method for parsing streamed data chunk by chunk (results are written to storage incrementally)
+    def parse_stream(self, chunks, city, latitude, file_path=None):
+        # chunks    - iterable of DataFrame chunks (e.g. from iter_excel_chunks or iter_csv_chunks)
+        # city      - city (station) name
+        # latitude  - geographical latitude of the city [deg]
+        # file_path - storage path (None - default Parquet storage)
+        #
+        # Returns number of written rows
+
+        with get_storage('parquet', file_path).open_writer(city) as writer:
+            for df in chunks:
+                # Fill, compute derived values and write (only one chunk is kept in memory):
+                writer.write(self.parse_city(df, city, latitude))
+
+        return writer.rows
+
+    # # # Method for preparing DataFrame read from Excel sheet (date index, relevant columns and short names)
+    @staticmethod
+    def prepare_sheet(df):
+        # df - DataFrame read from Excel sheet
 
         # Parse dates to datetime objects:
         df.Date = pd.to_datetime(df.Date, dayfirst=True)
         df = df.set_index('Date')
 
-        # Select relevant columns:
-        df = df[['Minimum temperature (°C)', 'Maximum temperature (°C)', 'Rainfall (mm)', 'Sunshine (hours)',
-                 'Speed of maximum wind gust (km/h)', '9am Temperature (°C)', '9am relative humidity (%)',
-                 '3pm Temperature (°C)', '3pm relative humidity (%)']]
+        # Select relevant columns (as numbers):
+        df = df[Parser.source_columns].apply(pd.to_numeric, errors='coerce')
 
         # Rename columns:
-        df.columns = ['min_temp', 'max_temp', 'rain', 'sun', 'wind', 'temp_9', 'hum_9', 'temp_3', 'hum_3']
+        df.columns = Parser.columns
 
         return df
 
@@ -87,65 +386,50 @@ class Parser:
         # df   - original DataFrame
         # city - city name
 
-        # For each row (day) in DataFrame:
-        for k in range(len(df)):
+        # Find all rows (days) with missing data:
+        missing = df.index[df.isnull().any(axis=1).values]
+
+        metrics.incr('rows_missing', len(missing), city=city)
+        if len(missing) == 0:
+            return df
+
+        # Merge missing days into consecutive date ranges (one WWO request per range):
+        ranges = self.downloader.coalesce_dates(missing)
 
-            # Check for missing data:
-            if df.iloc[k].isnull().sum() > 0:
+        # Download missing data from WWO (in parallel, with bounded number of workers):
+        with ThreadPoolExecutor(max_workers=self.n_workers) as pool:
+            downloads = pool.map(lambda r: self.downloader.get_weather_data_dates(
+                pd.date_range(r[0], r[1]), city), ranges)
+            downloads = {date: res for d in downloads for date, res in d.items()}
 
-                dt = df.index[k]
+        # Keep only successfully downloaded (missing) days:
+        results = {dt: downloads[dt.strftime('%Y-%m-%d')] for dt in missing if dt.strftime('%Y-%m-%d') in downloads}
 
-                # Download missing data from WWO (with WeatherDataDownloader class):
-                results = self.downloader.get_weather_data_with_retry(dt, city)
+        # Fill all missing values with new data (in a single assignment):
+        if results:
+            df_new = pd.DataFrame.from_dict(results, orient='index').reindex(columns=df.columns)
+            df = df.fillna(df_new)
+        metrics.incr('rows_filled', len(results), city=city)
 
-                # If data successfully downloaded:
-                if results:
-                    # Fill all missing values with new data:
-                    for col in df.columns:
-                        if np.isnan(df.loc[dt, col]):
-                            df.loc[dt, col] = results[col]
         return df
 
     # # # Function for calculating meteorological dew point:
     @staticmethod
     def calc_dew(RH, T):
-        # The calculation is based on dew point equations presented on
-        # https://en.wikipedia.org/wiki/Dew_point#Calculating_the_dew_point
-        #
         # RH - relative humidity vector [ % ]
         # T  - air temperature vector   [* C]
+        #
+        # Values are looked up in a precomputed table (see my_features.calc_dew)
 
-        # Dew point calculation constants:
-        b = 18.678
-        c = 257.14
-        d = 234.5
-
-        # Gamma parameter calculation:
-        g_m = np.log(RH / 100 * np.exp((b - T / d) * (T / (c + T))))
-
-        # Dew point calculation:
-        dew = (c * g_m / (b - g_m)).round(1)
-
-        return dew
+        return features.calc_dew(RH, T)
 
     # # # Function for calculating daily sunlight percentage
     @staticmethod
     def calc_sun_perc(day_of_year, sun_hour, geo_lat):
-        # The calculation is based on sunrise equations presented on
-        # https://en.wikipedia.org/wiki/Sunrise_equation
-        #
         # day_of_year - day of the year vector      [ / ]
         # sun_hour    - daily sunlight hours vector [ h ]
         # geo_lat     - geographical latitude       [deg]
+        #
+        # Daylight lengths are looked up in a per-latitude table (see my_features.daylight_table)
 
-        # Calculate solar declination:
-        dec = -23.45 * np.pi / 180 * np.cos(2 * np.pi * (day_of_year + 10) / 365)
-
-        # Calculate daylight length:
-        day_len = np.arccos(-np.tan(geo_lat * np.pi / 180) * np.tan(dec)) * 24 / np.pi
-
-        # Normalize sunlit hours with daylight length to get sunlight percentage:
-        sun_perc = (sun_hour / day_len * 100).round(1).clip(lower=0, upper=100)
-
-        return sun_perc
-
+        return features.calc_sun_perc(day_of_year, sun_hour, geo_lat)
@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+
+from src.my_parser import Parser
+from src.my_analyzer import Analyzer
+from src.my_aggregator import Aggregator
+from src.my_storage import get_storage
+from src.my_metrics import metrics
+
+
+class Pipeline:
+
+    # Pipeline stages and their upstream stages (in execution order):
+    stages = {'ingest': [],
+              'backfill': ['ingest'],
+              'derive': ['backfill'],
+              'score': ['derive'],
+              'aggregate': ['score', 'derive'],
+              'render': ['score', 'derive']}
+
+    # Method for class initialization:
+    def __init__(self, parser=None, analyzer=None, plotter=None, cities=None, start=None, end=None, freq='M',
+                 cache_dir=None):
+        # parser    - Parser instance (source data, cities and latitudes)
+        # analyzer  - Analyzer instance (comfort limits)
+        # plotter   - Plotter instance (rendering settings; None - skip graphs in render stage)
+        # cities    - list of selected cities (None - all parser cities)
+        # start     - first selected date (None - from the beginning of the data)
+        # end       - last selected date (None - until the end of the data)
+        # freq      - calendar period of aggregated counts
+        # cache_dir - directory of cached stage outputs and fingerprints
+
+        self.parser = parser or Parser()
+        self.analyzer = analyzer or Analyzer()
+        self.plotter = plotter
+        self.cities = cities or list(self.parser.cities)
+        self.start = start
+        self.end = end
+        self.freq = freq
+        self.cache_dir = cache_dir or 'data/pipeline'
+
+        unknown = [city for city in self.cities if city not in self.parser.cities]
+        if unknown:
+            raise ValueError('Unknown cities: ' + ', '.join(unknown))
+
+        # Outputs of stages (loaded or computed during the run):
+        self.outputs = {}
+
+    # Whether the whole date range is selected (parsed data is stored only then)
+    @property
+    def whole_range(self):
+        return self.start is None and self.end is None
+
+    # # # Method for computing stage configuration (everything, apart from upstream outputs, the stage depends on)
+    def stage_config(self, stage):
+        if stage == 'ingest':
+            return {'source': self.file_hash(self.parser.excel_file), 'cities': self.cities,
+                    'start': self.start, 'end': self.end}
+        if stage == 'backfill':
+            # Over the whole date range, stored data is updated incrementally (changed latitudes refill all rows):
+            return {'latitudes': [self.parser.latitudes[self.parser.cities.index(c)] for c in self.cities],
+                    'incremental': self.whole_range}
+        if stage == 'derive':
+            return {'latitudes': [self.parser.latitudes[self.parser.cities.index(c)] for c in self.cities]}
+        if stage == 'score':
+            return {'limits': self.analyzer.limits_key()}
+        if stage == 'aggregate':
+            return {'freq': self.freq}
+        if stage == 'render':
+            if self.plotter is None:
+                return {'graphs': None}
+            return {'graphs': self.plotter.graphs, 'fig_size': list(self.plotter.fig_size),
+                    'out_dir': self.plotter.out_dir, 'formats': self.plotter.formats,
+                    'summaries': self.plotter.summarizer is not None}
+        return {}
+
+    # # # Method for computing stage fingerprints (hash of stage configuration and upstream fingerprints)
+    def fingerprints(self):
+        fps = {}
+        for stage in self.stages:
+            content = json.dumps({'stage': stage, 'config': self.stage_config(stage),
+                                  'upstream': [fps[up] for up in self.stages[stage]]}, sort_keys=True, default=str)
+            fps[stage] = hashlib.sha1(content.encode()).hexdigest()
+        return fps
+
+    # # # Method for running selected stages (stale upstream stages are run as well, unchanged ones are skipped)
+    def run(self, targets=None, force=False):
+        # targets - list of requested stages (None - all stages)
+        # force   - rerun requested stages even if their inputs are unchanged
+        #
+        # Returns dictionary mapping stages to 'run' or 'skipped'
+
+        targets = targets or list(self.stages)
+        fps = self.fingerprints()
+        status = {}
+
+        # Resolve all stages needed for the requested ones:
+        needed = set()
+
+        def require(stage):
+            if stage not in needed:
+                needed.add(stage)
+                for up in self.stages[stage]:
+                    require(up)
+
+        for stage in targets:
+            require(stage)
+
+        for stage in [s for s in self.stages if s in needed]:
+            upstream_ran = any(status.get(up) == 'run' for up in self.stages[stage])
+            if not force and not upstream_ran and self.cached_fingerprint(stage) == fps[stage]:
+                status[stage] = 'skipped'
+                metrics.incr('pipeline_stages_skipped', stage=stage)
+                logging.info('Stage %s skipped (inputs unchanged)', stage)
+                continue
+
+            inputs = {up: self.output(up) for up in self.stages[stage]}
+            with metrics.span('pipeline.stage', stage=stage):
+                self.outputs[stage] = getattr(self, 'run_' + stage)(inputs)
+            self.save_output(stage, self.outputs[stage], fps[stage])
+            status[stage] = 'run'
+            logging.info('Stage %s done', stage)
+
+        return status
+
+    # # # Method for getting stage output (from memory, or from stage cache)
+    def output(self, stage):
+        if stage not in self.outputs:
+            self.outputs[stage] = pd.read_pickle(os.path.join(self.cache_dir, stage + '.pkl'))
+        return self.outputs[stage]
+
+    # # # Method for reading fingerprint of cached stage output (None if not cached)
+    def cached_fingerprint(self, stage):
+        fp_path = os.path.join(self.cache_dir, stage + '.json')
+        if not os.path.exists(fp_path) or not os.path.exists(os.path.join(self.cache_dir, stage + '.pkl')):
+            return None
+        with open(fp_path) as f:
+            return json.load(f)['fingerprint']
+
+    # # # Method for saving stage output and its fingerprint
+    def save_output(self, stage, output, fingerprint):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pd.to_pickle(output, os.path.join(self.cache_dir, stage + '.pkl'))
+        with open(os.path.join(self.cache_dir, stage + '.json'), 'w') as f:
+            json.dump({'fingerprint': fingerprint}, f)
+
+    # # # Stage: load selected cities and dates from the source workbook
+    def run_ingest(self, inputs):
+        sheets = [self.parser.cities.index(city) for city in self.cities]
+        dfs = self.parser.load_excel_sheets(sheets, self.parser.excel_file)
+        return {city: dfs[k].sort_index().loc[self.start:self.end] for city, k in zip(self.cities, sheets)}
+
+    # # # Stage: fill missing values (from WWO database)
+    def run_backfill(self, inputs):
+        # Returns parsed DFs, new or changed cities and manifest entries (None when the data is not stored)
+
+        sheets = inputs['ingest']
+
+        # Whole date range - filled by the parser (only new and changed rows are filled, when parsed data is
+        # already stored; values are derived in the derive stage):
+        if self.whole_range:
+            dfs, updated, manifest = self.parser.parse_cities(sheets, incremental=self.parser.parsed_dfs_exist(),
+                                                              derive=False)
+            return {'dfs': dfs, 'updated': list(updated), 'manifest': manifest}
+
+        # Selected dates - missing values are only filled (cities in parallel):
+        with ThreadPoolExecutor(max_workers=self.parser.n_city_workers) as pool:
+            filled = list(pool.map(lambda city: self.parser.fill_df(sheets[city], city), sheets))
+        return {'dfs': dict(zip(sheets, filled)), 'updated': [], 'manifest': None}
+
+    # # # Stage: compute derived values (and save parsed data and manifest, for the whole date range)
+    def run_derive(self, inputs):
+        backfill = inputs['backfill']
+        dfs = {}
+        for city, df in backfill['dfs'].items():
+            latitude = self.parser.latitudes[self.parser.cities.index(city)]
+            dfs[city] = self.parser.derive_df(df, latitude, self.parser.city_features(city, df, latitude))
+        if backfill['manifest'] is not None:
+            self.parser.save_parsed({city: dfs[city] for city in backfill['updated']}, backfill['manifest'])
+        return dfs
+
+    # # # Stage: compute daily comfort levels and day counts (saved to Excel, for the whole date range)
+    def run_score(self, inputs):
+        dfs = inputs['derive']
+        return {'scored': self.analyzer.score_batch(dfs),
+                'counts': self.analyzer.calc_day_counts(dfs, save=self.whole_range)}
+
+    # # # Stage: compute calendar comfort counts
+    def run_aggregate(self, inputs):
+        return Aggregator(self.analyzer).calendar_counts(inputs['derive'], self.freq)
+
+    # # # Stage: render graphs and export day counts
+    def run_render(self, inputs):
+        files = []
+        if self.plotter is not None:
+            # Over the whole date range, the rendered DFs are the stored parsed data:
+            files = self.plotter.render_report(inputs['derive'], storage=get_storage() if self.whole_range else None)
+            os.makedirs(self.plotter.out_dir, exist_ok=True)
+            inputs['score']['counts'].to_csv(os.path.join(self.plotter.out_dir, 'day_counts.csv'))
+        return files
+
+    # # # Method for hashing file content
+    @staticmethod
+    def file_hash(file_path):
+        sha = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        return sha.hexdigest()
@@ -1,112 +1,294 @@
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib import pyplot as plt
-import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+
 import pandas as pd
+import numpy as np
+
+from src.my_summary import Summarizer
+from src.my_metrics import metrics
+from src.my_schema import decode_column
+
+# Matplotlib and Seaborn are imported on first plot (see import_plotting), since they dominate the import time
+# of the package and the interactive backend needs a GUI toolkit:
+plt = None
+sns = None
+
+
+# Function for importing plotting libraries (with given Matplotlib backend)
+def import_plotting(backend=None):
+    # backend - Matplotlib backend (None - keep current backend)
+    global plt, sns
+
+    import matplotlib
+    # Backend selected before the first pyplot import is loaded directly (without loading the default one):
+    if backend is not None and 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use(backend)
+    from matplotlib import pyplot
+    import seaborn
+
+    if backend is not None and matplotlib.get_backend().lower() != backend.lower():
+        pyplot.switch_backend(backend)
+    plt, sns = pyplot, seaborn
 
 
 class Plotter:
-    def __init__(self, fig_size=None):
+
+    # Names of all graphs (and corresponding plotting methods):
+    graphs = ['temp', 'humidity', 'sunlight', 'wind', 'rain']
+
+    # Plotted measurements (columns and their labels):
+    measurements = {'min_temp': 'Min Temp', 'max_temp': 'Max Temp', 'dew_3': 'Dew Point at 3 pm',
+                    'dew_9': 'Dew Point at 9 am', 'sun_perc': 'Sunlight Percentage', 'wind': 'Maximum Wind Speed',
+                    'rain': 'Daily Precipitation'}
+
+    def __init__(self, fig_size=None, backend='TkAgg', headless=False, out_dir=None, formats=None, summaries=False):
+        # fig_size  - figure size [inch]
+        # backend   - Matplotlib backend of interactive mode (None - keep current backend)
+        # headless  - export figures to files (with Agg backend), instead of showing them
+        # out_dir   - output directory of exported figures
+        # formats   - list of exported file formats (e.g. ['png', 'svg', 'pdf'])
+        # summaries - draw violins from precomputed (cached) density summaries, instead of raw data
+
         self.fig_size = fig_size or (25, 10)
         self.palette = 'Set3'
+        self.headless = headless
+        self.out_dir = out_dir or 'output'
+        self.formats = formats or ['png']
+        # Cached long-format DataFrame (key, source DFs, DataFrame, measurement offsets):
+        self.long = None
+        # Density summaries (render time independent of number of rows):
+        self.summarizer = Summarizer() if summaries else None
+        # Summaries of plotted data given in advance (e.g. to report workers; None - get them from summarizer):
+        self.summaries = None
+
+        # Matplotlib backend (selected on first plot):
+        self.backend = 'Agg' if headless else backend
 
     # Method for plotting temperature violin graph
-    def plot_temp_graph(self, dfs):
-        # dfs - dictionary mapping cities to corresponding DataFrames
+    def plot_temp_graph(self, dfs, file_name='temp'):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # file_name - name of exported file (in headless mode)
 
-        # Merge relevant data to single DataFrame (for violin plot)
-        dfs_temp = []
-        for city in dfs:
-            df_min = pd.DataFrame(dfs[city].min_temp).rename(columns={'min_temp': 'Temperature [*C]'})
-            df_min['Measurement'] = 'Min Temp'
-            df_max = pd.DataFrame(dfs[city].max_temp).rename(columns={'max_temp': 'Temperature [*C]'})
-            df_max['Measurement'] = 'Max Temp'
-            df = pd.concat([df_min, df_max])
-            df['City'] = city
-            dfs_temp += [df]
-        df = pd.concat(dfs_temp)
-
-        plt.figure(figsize=self.fig_size)
-        sns.set_style("whitegrid")
-        sns.violinplot(x="City", y="Temperature [*C]", hue="Measurement", data=df, palette=self.palette,
-                       split=True, scale="count", inner="quartile", cut=0)
-        plt.show()
+        self.plot_violin(dfs, ['min_temp', 'max_temp'], 'Temperature [*C]', file_name)
 
     # Method for plotting humidity violin graph
-    def plot_humidity_graph(self, dfs):
-        # dfs - dictionary mapping cities to corresponding DataFrames
+    def plot_humidity_graph(self, dfs, file_name='humidity'):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # file_name - name of exported file (in headless mode)
 
-        # Merge relevant data to single DataFrame (for violin plot)
-        dfs_hum = []
-        for city in dfs:
-            df_max = pd.DataFrame(dfs[city].dew_9).rename(columns={'dew_9': 'Dew Point [*C]'})
-            df_max['Measurement'] = 'Dew Point at 9 am'
-            df_min = pd.DataFrame(dfs[city].dew_3).rename(columns={'dew_3': 'Dew Point [*C]'})
-            df_min['Measurement'] = 'Dew Point at 3 pm'
-            df = pd.concat([df_min, df_max])
-            df['City'] = city
-            dfs_hum += [df]
-        df = pd.concat(dfs_hum)
-
-        plt.figure(figsize=self.fig_size)
-        sns.set_style("whitegrid")
-        sns.violinplot(x="City", y="Dew Point [*C]", hue="Measurement", data=df, palette=self.palette,
-                       split=True, scale="count", inner="quartile", cut=0)
-        plt.show()
+        self.plot_violin(dfs, ['dew_3', 'dew_9'], 'Dew Point [*C]', file_name)
 
     # Method for plotting sunlight violin graph
-    def plot_sunlight_graph(self, dfs):
-        # dfs - dictionary mapping cities to corresponding DataFrames
-
-        # Merge relevant data to single DataFrame (for violin plot)
-        dfs_sun = []
-        for city in dfs:
-            df = pd.DataFrame(dfs[city].sun_perc).rename(columns={'sun_perc': 'Sunlight Percentage [%]'})
-            df['City'] = city
-            dfs_sun += [df]
-        df = pd.concat(dfs_sun)
+    def plot_sunlight_graph(self, dfs, file_name='sunlight'):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # file_name - name of exported file (in headless mode)
 
-        plt.figure(figsize=self.fig_size)
-        sns.set_style("whitegrid")
-        sns.violinplot(x='City', y='Sunlight Percentage [%]', data=df, palette=self.palette,
-                       scale='count', inner='quartile', cut=0)
+        self.plot_violin(dfs, ['sun_perc'], 'Sunlight Percentage [%]', file_name)
         # plt.ylim((0, 100))
-        plt.show()
 
     # Method for plotting wind speed violin graph
-    def plot_wind_graph(self, dfs):
-        # dfs - dictionary mapping cities to corresponding DataFrames
+    def plot_wind_graph(self, dfs, file_name='wind'):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # file_name - name of exported file (in headless mode)
+
+        self.plot_violin(dfs, ['wind'], 'Maximum Wind Speed [km/h]', file_name)
+
+    # Method for plotting rainfall violin graph
+    def plot_rain_graph(self, dfs, file_name='rain'):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # file_name - name of exported file (in headless mode)
+
+        self.plot_violin(dfs, ['rain'], 'Daily Precipitation [mm/m^2]', file_name)
+
+    # Method for plotting violin graph of given measurements (split violins for two measurements)
+    def plot_violin(self, dfs, columns, y_label, file_name):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # columns   - plotted measurement columns (one or two)
+        # y_label   - label of the value axis
+        # file_name - name of exported file (in headless mode)
+
+        with metrics.span('plot.violin', graph=file_name):
+            self.draw_violin(dfs, columns, y_label, file_name)
+
+    # Method for drawing violin graph (see plot_violin)
+    def draw_violin(self, dfs, columns, y_label, file_name):
+        import_plotting(self.backend)
+
+        # Draw from precomputed summaries (if enabled):
+        if self.summarizer is not None:
+            fig = plt.figure(figsize=self.fig_size)
+            sns.set_style("whitegrid")
+            summaries = self.summaries if self.summaries is not None else self.summarizer.get(dfs, columns)
+            self.draw_summary_violins(plt.gca(), summaries, list(dfs), columns, y_label)
+            self.finish(fig, file_name)
+            return
 
-        # Merge relevant data to single DataFrame (for violin plot)
-        dfs_wind = []
-        for city in dfs:
-            df = pd.DataFrame(dfs[city].wind).rename(columns={'wind': 'Maximum Wind Speed [km/h]'})
-            df['City'] = city
-            dfs_wind += [df]
-        df = pd.concat(dfs_wind)
+        # Slice relevant data from the shared long-format DataFrame:
+        df = self.long_slice(dfs, columns)
+        hue = dict(hue='Measurement', hue_order=[self.measurements[c] for c in columns],
+                   split=True) if len(columns) > 1 else {}
 
-        plt.figure(figsize=self.fig_size)
+        fig = plt.figure(figsize=self.fig_size)
         sns.set_style("whitegrid")
-        sns.violinplot(x='City', y='Maximum Wind Speed [km/h]', data=df, palette=self.palette,
-                       scale='count', inner='quartile', cut=0)
-        plt.show()
+        sns.violinplot(x='City', y='Value', data=df, order=list(dfs), palette=self.palette,
+                       scale='count', inner='quartile', cut=0, **hue)
+        plt.ylabel(y_label)
+        self.finish(fig, file_name)
 
-    # Method for plotting rainfall violin graph
-    def plot_rain_graph(self, dfs):
+    # Method for drawing violins from density summaries (count-scaled, split for two measurements)
+    def draw_summary_violins(self, ax, summaries, cities, columns, y_label, width=0.8):
+        # ax        - Matplotlib axes
+        # summaries - dictionary mapping (city, column) pairs to summaries (see Summarizer)
+        # cities    - list of cities (in plotting order)
+        # columns   - plotted measurement columns (one or two)
+        # y_label   - label of the value axis
+        # width     - maximum violin width
+
+        import_plotting(self.backend)
+
+        split = len(columns) > 1
+        colors = sns.color_palette(self.palette, len(columns) if split else len(cities))
+        max_count = max([summaries[(city, col)]['count'] for city in cities for col in columns] + [1])
+
+        for i, city in enumerate(cities):
+            for j, col in enumerate(columns):
+                s = summaries[(city, col)]
+                if s['count'] == 0:
+                    continue
+
+                # Density normalized to its maximum, scaled by number of observations:
+                half = s['density'] / s['density'].max() * width / 2 * s['count'] / max_count
+
+                # Left half for the first measurement, right half for the second one (both halves if not split):
+                left = i - half if not split or j == 0 else np.full(len(half), float(i))
+                right = i + half if not split or j == 1 else np.full(len(half), float(i))
+
+                ax.fill_betweenx(s['grid'], left, right, facecolor=colors[j if split else i], edgecolor='gray',
+                                 linewidth=1, label=self.measurements[col] if split and i == 0 else None)
+
+                # Quartile lines:
+                for q, dashes in [(s['q25'], (3, 1.5)), (s['q50'], (6, 3)), (s['q75'], (3, 1.5))]:
+                    h = np.interp(q, s['grid'], half)
+                    x0 = i - h if not split or j == 0 else i
+                    x1 = i + h if not split or j == 1 else i
+                    ax.plot([x0, x1], [q, q], color='gray', linewidth=1, dashes=dashes)
+
+        ax.set_xticks(range(len(cities)))
+        ax.set_xticklabels(cities)
+        ax.set_xlim(-0.5, len(cities) - 0.5)
+        ax.set_xlabel('City')
+        ax.set_ylabel(y_label)
+        if split:
+            ax.legend(title='Measurement')
+
+    # Method for building long-format DataFrame of all plotted measurements (built once per dfs, then reused)
+    def long_frame(self, dfs):
         # dfs - dictionary mapping cities to corresponding DataFrames
+        #
+        # Returns long DataFrame (categorical City and Measurement columns, Value column) and row offsets of
+        # each measurement (rows of each measurement are contiguous)
 
-        # Merge relevant data to single DataFrame (for violin plot)
-        dfs_rain = []
-        for city in dfs:
-            df = pd.DataFrame(dfs[city].rain).rename(columns={'rain': 'Daily Precipitation [mm/m^2]'})
-            df['City'] = city
-            dfs_rain += [df]
-        df = pd.concat(dfs_rain)
+        key = tuple((city, id(dfs[city])) for city in dfs)
+        if self.long is not None and self.long[0] == key:
+            return self.long[2], self.long[3]
+
+        cities = list(dfs)
+        columns = list(self.measurements)
+        lengths = [len(dfs[city]) for city in cities]
+
+        metrics.incr('plot_frames_built')
+
+        # Melt all measurements of all cities (measurement-major order):
+        values = np.concatenate([decode_column(dfs[city][col].values, col) for col in columns for city in cities])
+        city_codes = np.tile(np.repeat(np.arange(len(cities), dtype=np.int32), lengths), len(columns))
+        measurement_codes = np.repeat(np.arange(len(columns), dtype=np.int8), sum(lengths))
+
+        df = pd.DataFrame({'City': pd.Categorical.from_codes(city_codes, categories=cities),
+                           'Measurement': pd.Categorical.from_codes(measurement_codes,
+                                                                    categories=list(self.measurements.values())),
+                           'Value': values})
+        offsets = {col: k * sum(lengths) for k, col in enumerate(columns)}
+
+        # Keep references to the source DFs (so their ids stay valid while cached):
+        self.long = (key, dfs.copy(), df, offsets)
+        return df, offsets
+
+    # Method for slicing measurements from the long-format DataFrame
+    def long_slice(self, dfs, columns):
+        df, offsets = self.long_frame(dfs)
+        n = len(df) // len(self.measurements)
+
+        # Neighbouring measurements are sliced at once (without copying):
+        order = list(self.measurements)
+        if order[order.index(columns[0]):order.index(columns[0]) + len(columns)] == list(columns):
+            return df.iloc[offsets[columns[0]]:offsets[columns[0]] + n * len(columns)]
+
+        return pd.concat([df.iloc[offsets[col]:offsets[col] + n] for col in columns])
+
+    # Method for finishing the figure (show it interactively, or export it to files), then closing it
+    def finish(self, fig, file_name):
+        # fig       - Matplotlib figure
+        # file_name - name of exported file (without extension)
+
+        try:
+            if self.headless:
+                os.makedirs(self.out_dir, exist_ok=True)
+                for fmt in self.formats:
+                    fig.savefig(os.path.join(self.out_dir, file_name + '.' + fmt), format=fmt, bbox_inches='tight')
+            else:
+                plt.show()
+        finally:
+            plt.close(fig)
+
+    # Method for rendering all graphs to files (in parallel worker processes)
+    def render_report(self, dfs, graphs=None, per_city=False, periods=None, n_workers=None, storage=None):
+        # dfs       - dictionary mapping cities to corresponding DataFrames
+        # graphs    - list of graphs to render (None - all graphs)
+        # per_city  - also render separate graphs of each city
+        # periods   - dictionary mapping period names to (start, end) dates (renders graphs of each period)
+        # n_workers - number of worker processes (None - number of CPU cores)
+        # storage   - storage of the DFs (their density summaries are kept next to it; None - not stored)
+        #
+        # Returns list of exported file names (without extension)
+
+        graphs = graphs or self.graphs
+
+        # Data variants (all cities, each city, each period):
+        variants = [('', dfs)]
+        if per_city:
+            variants += [('_' + city, {city: dfs[city]}) for city in dfs]
+        for period, (start, end) in (periods or {}).items():
+            variants += [('_' + str(period), {city: dfs[city].loc[start:end] for city in dfs})]
+
+        tasks = [(graph, graph + suffix, data) for suffix, data in variants for graph in graphs]
+
+        # Density summaries are prepared here and passed to the workers (all cities from the summaries file of the
+        # storage, single cities as its subsets, periods summarized directly):
+        summaries = [None] * len(variants)
+        if self.summarizer is not None:
+            columns = [col for col in self.measurements if all(col in df for df in dfs.values())]
+            full = self.summarizer.get(dfs, columns, storage)
+            summaries = [full] + ([{key: full[key] for key in full if key[0] == city} for city in dfs]
+                                  if per_city else [])
+            summaries += [self.summarizer.summarize(data, columns) for _, data in variants[len(summaries):]]
+
+        # Render each graph in separate process (figures are created and closed in the workers):
+        with metrics.span('plot.report'), ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(render_graph, self.fig_size, self.out_dir, self.formats, graph, data,
+                                   graph + suffix, summary)
+                       for (suffix, data), summary in zip(variants, summaries) for graph in graphs]
+            for future in futures:
+                future.result()
+
+        return [name for _, name, _ in tasks]
 
-        plt.figure(figsize=self.fig_size)
-        sns.set_style("whitegrid")
-        sns.violinplot(x='City', y='Daily Precipitation [mm/m^2]', data=df, palette=self.palette,
-                       scale='count', inner='quartile', cut=0)
-        plt.show()
 
+# Function for rendering single graph to files (executed in worker process)
+def render_graph(fig_size, out_dir, formats, graph, dfs, file_name, summaries=None):
+    # summaries - density summaries of the data (None - draw violins from raw data)
 
+    plotter = Plotter(fig_size=fig_size, headless=True, out_dir=out_dir, formats=formats,
+                      summaries=summaries is not None)
+    plotter.summaries = summaries
+    getattr(plotter, 'plot_' + graph + '_graph')(dfs, file_name)
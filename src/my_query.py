@@ -0,0 +1,209 @@
+import pandas as pd
+import numpy as np
+
+from src.my_analyzer import Analyzer
+from src.my_schema import decode_column
+
+
+class GrowingArray:
+    # Array with amortized O(1) appending of rows (capacity is doubled when exhausted)
+
+    def __init__(self, width, dtype):
+        self.data = np.zeros((16, width), dtype=dtype)
+        self.n = 0
+
+    # Method for appending rows
+    def extend(self, rows):
+        if self.n + len(rows) > len(self.data):
+            size = max(2 * len(self.data), self.n + len(rows))
+            data = np.zeros((size, self.data.shape[1]), dtype=self.data.dtype)
+            data[:self.n] = self.data[:self.n]
+            self.data = data
+        self.data[self.n:self.n + len(rows)] = rows
+        self.n += len(rows)
+
+    # Filled rows (view, without copying)
+    @property
+    def values(self):
+        return self.data[:self.n]
+
+
+class CityIndex:
+    # Cumulative counts of single city (over all days, and over days of each month of the year)
+
+    def __init__(self, width):
+        # width - number of counted indicators
+        self.width = width
+        # Day numbers (days since 1970-01-01) and cumulative counts (starting with zero row):
+        self.days = GrowingArray(1, np.int64)
+        self.cum = GrowingArray(width, np.int32)
+        self.cum.extend(np.zeros((1, width), dtype=np.int32))
+        # The same for days of each month of the year (1 - 12):
+        self.month_days = {m: GrowingArray(1, np.int64) for m in range(1, 13)}
+        self.month_cum = {m: GrowingArray(width, np.int32) for m in range(1, 13)}
+        for m in range(1, 13):
+            self.month_cum[m].extend(np.zeros((1, width), dtype=np.int32))
+
+    # Last indexed day number (None if empty)
+    @property
+    def last_day(self):
+        return self.days.values[-1, 0] if self.days.n else None
+
+    # Method for appending days (sorted, all later than the last indexed day)
+    def extend(self, days, months, counts):
+        # days   - int64 array of day numbers
+        # months - array of months of the days (1 - 12)
+        # counts - int array of shape [days, width] (indicators of each day)
+
+        self.days.extend(days[:, None])
+        self.cum.extend(self.cum.values[-1] + np.cumsum(counts, axis=0))
+        for m in np.unique(months):
+            selected = months == m
+            self.month_days[m].extend(days[selected][:, None])
+            self.month_cum[m].extend(self.month_cum[m].values[-1] + np.cumsum(counts[selected], axis=0))
+
+    # Method for counting indicators over range of days (binary search and subtraction)
+    def count(self, first=None, last=None, month=None):
+        # first, last - first and last day number (None - unbounded)
+        # month       - month of the year (None - all days)
+
+        days = (self.days if month is None else self.month_days[month]).values[:, 0]
+        cum = (self.cum if month is None else self.month_cum[month]).values
+        lo = 0 if first is None else np.searchsorted(days, first, side='left')
+        hi = len(days) if last is None else np.searchsorted(days, last, side='right')
+        return cum[hi] - cum[min(lo, hi)]
+
+
+class QueryIndex:
+    # Prefix-sum index of comfort levels (answers date range, city set and month of year counts in O(log n))
+
+    # Comfort level names (in order of comfort level values: 0 - bad, 1 - good, 2 - great day):
+    levels = ['Bad Day', 'Good Day', 'Great Day']
+
+    # Method for class initialization:
+    def __init__(self, analyzer=None):
+        # analyzer - Analyzer instance (comfort limits)
+
+        self.analyzer = analyzer or Analyzer()
+        # Counted indicators (comfort levels, then levels of each parameter):
+        self.columns = ([('comfort', level) for level in range(3)] +
+                        [(crit, level) for crit in self.analyzer.criteria for level in range(3)])
+        self.cities = {}
+        # Comfort limits the index was built with:
+        self.limits = self.analyzer.limits_key()
+
+    # # # Method for building index of given cities (replaces previously indexed data of the same cities)
+    def build(self, dfs):
+        # dfs - dictionary mapping cities to corresponding DataFrames
+        #
+        # Comfort levels are taken from the analyzer's batch scores (reused when already scored)
+
+        self.limits = self.analyzer.limits_key()
+        scored = self.analyzer.score_batch(dfs).score.values
+
+        # Split stacked scores back into cities (rows of each city are contiguous):
+        bounds = np.cumsum([0] + [len(dfs[city]) for city in dfs])
+        for k, city in enumerate(dfs):
+            self.cities[city] = CityIndex(len(self.columns))
+            self.append_city(city, dfs[city], scored[bounds[k]:bounds[k + 1]])
+
+        return self
+
+    # # # Method for appending new days (later than the last indexed day of each city, new cities are added)
+    def append(self, dfs):
+        # dfs - dictionary mapping cities to DataFrames with new days only
+
+        if self.analyzer.limits_key() != self.limits:
+            raise ValueError('Comfort limits have changed since the index was built - rebuild the index')
+
+        for city, df in dfs.items():
+            self.append_city(city, df)
+
+        return self
+
+    # Method for appending new days of single city
+    def append_city(self, city, df, scores=None):
+        # city   - city name
+        # df     - DataFrame with new days
+        # scores - comfort levels of the days (None - score them here)
+
+        if len(df) == 0:
+            return
+
+        # Sort days by date (if needed):
+        if not df.index.is_monotonic_increasing:
+            order = np.argsort(df.index.values, kind='mergesort')
+            df = df.iloc[order]
+            scores = scores[order] if scores is not None else None
+        days = df.index.values.astype('datetime64[D]').astype(np.int64)
+
+        index = self.cities.setdefault(city, CityIndex(len(self.columns)))
+        if index.last_day is not None and days[0] <= index.last_day:
+            raise ValueError('Appended days of ' + city + ' must follow the last indexed day (' +
+                             str(np.datetime64(int(index.last_day), 'D')) + ') - rebuild the index')
+
+        index.extend(days, df.index.month.values, self.indicators(df, scores))
+
+    # # # Method for computing daily indicators (one-hot comfort levels and parameter levels) of single DF
+    def indicators(self, df, scores=None):
+        # df     - DataFrame
+        # scores - comfort levels of the days (None - score them here)
+
+        arrays = {col: decode_column(df[col].values, col) for col in self.analyzer.columns}
+        if scores is None:
+            scores = self.analyzer.score_arrays(arrays)
+        levels = np.column_stack([scores, self.analyzer.criteria_arrays(arrays)])
+
+        # One-hot encoding (3 columns per indicator):
+        onehot = np.zeros((len(df), len(self.columns)), dtype=np.int32)
+        rows = np.arange(len(df))
+        for k in range(levels.shape[1]):
+            onehot[rows, 3 * k + levels[:, k]] = 1
+        return onehot
+
+    # Method for converting date to day number (None stays None)
+    @staticmethod
+    def to_day(date):
+        if date is None:
+            return None
+        return int(pd.Timestamp(date).to_datetime64().astype('datetime64[D]').astype(np.int64))
+
+    # # # Method for counting days of each comfort level (or parameter level) of each city
+    def count_by_city(self, cities=None, start=None, end=None, months=None, criterion=None):
+        # cities    - list of cities (None - all indexed cities)
+        # start     - first date (None - unbounded)
+        # end       - last date (None - unbounded)
+        # months    - list of months of the year (1 - 12, None - all months)
+        # criterion - parameter ('temp', 'dew', 'sun', 'rain' or 'wind', None - overall comfort level)
+        #
+        # Returns DataFrame with day counts (levels in rows, from 'Great Day' to 'Bad Day', cities in columns)
+
+        group = criterion or 'comfort'
+        if group != 'comfort' and group not in self.analyzer.criteria:
+            raise KeyError('Unknown comfort parameter: ' + str(criterion))
+        k = self.columns.index((group, 0))
+
+        cities = list(self.cities) if cities is None else list(cities)
+        unknown = [city for city in cities if city not in self.cities]
+        if unknown:
+            raise KeyError('Cities are not indexed: ' + ', '.join(unknown))
+
+        first, last = self.to_day(start), self.to_day(end)
+        counts = {}
+        for city in cities:
+            if months is None:
+                total = self.cities[city].count(first, last)
+            else:
+                total = sum((self.cities[city].count(first, last, m) for m in set(months)),
+                            np.zeros(len(self.columns), dtype=np.int64))
+            counts[city] = total[k:k + 3][::-1]
+
+        return pd.DataFrame(counts, index=self.levels[::-1], columns=cities)
+
+    # # # Method for counting days of each comfort level (or parameter level) over all given cities
+    def count(self, cities=None, start=None, end=None, months=None, criterion=None):
+        # Arguments are the same as of count_by_city
+        #
+        # Returns Series with day counts (from 'Great Day' to 'Bad Day')
+
+        return self.count_by_city(cities, start, end, months, criterion).sum(axis=1)
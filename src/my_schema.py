@@ -0,0 +1,170 @@
+import pandas as pd
+import numpy as np
+
+# Decimal places of parsed measurements (source measurements are recorded with one decimal place at most):
+COLUMN_DECIMALS = {'min_temp': 1, 'max_temp': 1, 'rain': 1, 'sun': 1, 'wind': 0, 'temp_9': 1, 'hum_9': 0,
+                   'temp_3': 1, 'hum_3': 0}
+
+# Decimal places of derived values (rounded when computed, stored as float32 in compact DFs):
+DERIVED_DECIMALS = {'dew_9': 1, 'dew_3': 1, 'sun_perc': 1}
+
+# Missing value of scaled integer columns:
+INT16_MISSING = np.iinfo(np.int16).min
+
+
+# Function for computing maximum absolute value of array (0 for empty array)
+def abs_max(values):
+    return np.abs(values).max() if len(values) else 0
+
+
+# Function for decoding (compact or regular) column values into float64 array
+def decode_column(values, col):
+    # values - NumPy array of column values (float64, float32 or scaled int16)
+    # col    - column name
+    #
+    # Float64 values are returned without copying
+
+    if values.dtype == np.float64:
+        return values
+    decimals = COLUMN_DECIMALS.get(col)
+
+    if values.dtype == np.int16:
+        decoded = values / 10.0 ** decimals
+        decoded[values == INT16_MISSING] = np.nan
+        return decoded
+
+    decoded = values.astype(np.float64)
+    # Float32 values of source measurements and rounded derived values are rounded back to their exact float64
+    # values (so that comparisons with one-decimal comfort limits match regular DFs):
+    decimals = DERIVED_DECIMALS.get(col, decimals)
+    if decimals is not None:
+        decoded = decoded.round(decimals)
+    return decoded
+
+
+class CompactSchema:
+    # Compact representation of parsed station DFs (scaled int16 or float32 measurements, shared date index)
+
+    # Method for class initialization:
+    def __init__(self, mode='int16', tolerance=1e-4):
+        # mode      - representation of source measurements ('int16' - scaled integers, 'float32')
+        # tolerance - maximum round trip error of derived (computed) values, relative to their magnitude
+        #
+        # Derived values (dew points, sunlight percentage) are always stored as float32
+
+        if mode not in ('int16', 'float32'):
+            raise ValueError('Unknown compact schema mode: ' + str(mode) + ' (expected int16 or float32)')
+        self.mode = mode
+        self.tolerance = tolerance
+
+    # # # Method for converting single column to compact dtype
+    def compact_column(self, values, col):
+        # values - NumPy float array of column values
+        # col    - column name
+
+        decimals = COLUMN_DECIMALS.get(col)
+        if self.mode == 'float32' or decimals is None:
+            return values.astype(np.float32)
+
+        scaled = np.round(values * 10 ** decimals)
+        missing = np.isnan(scaled)
+        if abs_max(scaled[~missing]) >= -INT16_MISSING:
+            raise ValueError('Column ' + col + ' exceeds the int16 range (with ' + str(decimals) + ' decimals)')
+
+        return np.where(missing, INT16_MISSING, scaled).astype(np.int16)
+
+    # # # Method for converting DF to compact DF
+    def compact(self, df):
+        # df - parsed DataFrame (float columns)
+        return pd.DataFrame({col: self.compact_column(df[col].values, col) for col in df.columns},
+                            index=df.index, columns=df.columns)
+
+    # # # Method for converting compact DF back to regular (float64) DF
+    @staticmethod
+    def expand(df):
+        # df - compact DataFrame
+        return pd.DataFrame({col: decode_column(df[col].values, col) for col in df.columns},
+                            index=df.index, columns=df.columns)
+
+    # # # Method for converting all cities to compact DFs (identical date indexes are shared)
+    def compact_dfs(self, dfs, validate=True):
+        # dfs      - dictionary mapping cities to corresponding DataFrames
+        # validate - check round trip precision of each city (raises ValueError if exceeded)
+
+        compact = {}
+        indexes = []
+        for city, df in dfs.items():
+            compact[city] = self.compact(df)
+            if validate:
+                self.validate(df, compact[city])
+
+            # Reuse the same index object for cities with identical dates:
+            shared = next((index for index in indexes if index.equals(df.index)), None)
+            if shared is None:
+                indexes.append(compact[city].index)
+            else:
+                compact[city].index = shared
+
+        return compact
+
+    # # # Method for validating round trip precision of given DF
+    def validate(self, df, compact=None):
+        # df      - parsed DataFrame (float columns)
+        # compact - compact version of the DF (None - compact it here)
+        #
+        # Returns DataFrame with maximum absolute error and allowed error of each column (raises ValueError if
+        # any column loses more precision than allowed, or its missing values change)
+
+        expanded = self.expand(self.compact(df) if compact is None else compact)
+        report = {}
+
+        for col in df.columns:
+            original, restored = df[col].values.astype(np.float64), expanded[col].values
+            if not np.array_equal(np.isnan(original), np.isnan(restored)):
+                raise ValueError('Missing values of column ' + col + ' are not preserved')
+
+            valid = ~np.isnan(original)
+            error = abs_max(original[valid] - restored[valid])
+            decimals = COLUMN_DECIMALS.get(col, DERIVED_DECIMALS.get(col))
+            if decimals is not None:
+                # Source measurements and rounded derived values are restored exactly (up to float64 rounding of
+                # their decimal values):
+                allowed = 1e-9
+            else:
+                allowed = self.tolerance * max(abs_max(original[valid]), 1)
+            if error > allowed:
+                raise ValueError('Round trip error of column %s is %g (allowed %g) - values with more than %s '
+                                 'decimals?' % (col, error, allowed, decimals))
+            report[col] = [error, allowed]
+
+        return pd.DataFrame.from_dict(report, orient='index', columns=['max_error', 'allowed_error'])
+
+    # # # Method for reporting memory usage of regular and compact DFs
+    @staticmethod
+    def memory_report(dfs, compact_dfs):
+        # dfs         - dictionary mapping cities to regular DataFrames
+        # compact_dfs - dictionary mapping cities to compact DataFrames (see compact_dfs)
+        #
+        # Returns DataFrame with memory of each city (and total), in bytes and bytes per station-year
+        # (shared indexes are counted once, at their first city)
+
+        def usage(dfs):
+            seen = set()
+            result = {}
+            for city, df in dfs.items():
+                data = df.memory_usage(index=False, deep=True).sum()
+                index = 0 if id(df.index) in seen else df.index.memory_usage(deep=True)
+                seen.add(id(df.index))
+                result[city] = data + index
+            return result
+
+        regular, compact = usage(dfs), usage(compact_dfs)
+        report = pd.DataFrame({'years': {city: len(dfs[city]) / 365.25 for city in dfs},
+                               'regular_bytes': regular, 'compact_bytes': compact},
+                              columns=['years', 'regular_bytes', 'compact_bytes'])
+        report.loc['Total'] = report.sum()
+
+        report['regular_per_year'] = report.regular_bytes / report.years
+        report['compact_per_year'] = report.compact_bytes / report.years
+        report['reduction'] = report.regular_bytes / report.compact_bytes
+        return report
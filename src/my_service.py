@@ -0,0 +1,280 @@
+from collections import OrderedDict
+import urllib.parse
+import threading
+import asyncio
+import logging
+import json
+
+import numpy as np
+
+from src.my_analyzer import Analyzer
+from src.my_query import QueryIndex
+from src.my_sweep import Sweeper
+from src.my_storage import get_storage
+from src.my_metrics import metrics
+
+
+class ServiceState:
+    # Loaded parsed data with hot scores, query index and sweep features (replaced as a whole on reload)
+
+    # Method for class initialization:
+    def __init__(self, dfs, version=None):
+        # dfs     - dictionary mapping cities to corresponding DataFrames
+        # version - version of the loaded data (e.g. files and modification time of the parsed data)
+
+        self.dfs = dfs
+        self.version = version
+        self.analyzer = Analyzer()
+        # Daily comfort levels (stacked over all cities) and prefix-sum index built from them:
+        self.scored = self.analyzer.score_batch(dfs)
+        self.index = QueryIndex(self.analyzer).build(dfs)
+        # Positions of each city in the stacked rows:
+        bounds = np.cumsum([0] + [len(dfs[city]) for city in dfs])
+        self.bounds = {city: (bounds[k], bounds[k + 1]) for k, city in enumerate(dfs)}
+        # Features of threshold override queries (prepared once) and day numbers of stacked rows:
+        self.sweeper = Sweeper(self.analyzer)
+        self.sweeper.prepare(dfs)
+        self.days = self.scored.index.values.astype('datetime64[D]').astype(np.int64)
+
+
+class ComfortService:
+    # Local HTTP/JSON service answering comfort queries from memory
+    #
+    # Endpoints (GET, parameters in query string):
+    #   /health                                               - loaded data version and cities
+    #   /counts?cities=A,B&start=&end=&months=12,1,2&criterion= - comfort (or parameter) level counts per city
+    #   /days?city=A&start=&end=                              - daily comfort levels of single city
+    #   /override?temp_1.min=16&wind_2.max=40&cities=&start=&end= - counts with overridden comfort limits
+
+    # Method for class initialization:
+    def __init__(self, fmt='parquet', path=None, dfs=None, cache_size=1024, reload_interval=2.0):
+        # fmt             - parsed data storage format
+        # path            - parsed data storage path (None - default path of given format)
+        # dfs             - dictionary mapping cities to DataFrames (served instead of stored data, no reloading)
+        # cache_size      - maximum number of cached responses
+        # reload_interval - interval of checking parsed data for changes [s] (None - never reload)
+
+        self.storage = get_storage(fmt, path) if dfs is None else None
+        self.cache_size = cache_size
+        self.reload_interval = reload_interval if dfs is None else None
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.state = ServiceState(dfs, 'memory') if dfs is not None else self.load_state()
+        self.server = None
+        self.watch_task = None
+
+    # # # Method for computing version of the stored parsed data (its tables and their latest modification time)
+    def data_version(self):
+        return self.storage.version()
+
+    # # # Method for loading stored parsed data (scores and index are computed here, off the event loop)
+    def load_state(self):
+        version = self.data_version()
+        with metrics.span('service.load'):
+            state = ServiceState(self.storage.load(), version)
+        logging.info('Loaded parsed data of %d cities (version %s)', len(state.dfs), version)
+        return state
+
+    # # # Method for reloading parsed data when it changes (runs as background task)
+    async def watch(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                version = await loop.run_in_executor(None, self.data_version)
+                if version is None or version == self.state.version:
+                    continue
+                state = await loop.run_in_executor(None, self.load_state)
+            except Exception as e:
+                # Parsed data may be in the middle of being rewritten (retried on the next check):
+                logging.warning('Reloading parsed data failed (%s: %s)', type(e).__name__, e)
+                continue
+
+            # Swap the whole state at once (requests in progress finish with the old one):
+            self.state = state
+            with self.cache_lock:
+                self.cache.clear()
+            metrics.incr('service_reloads')
+
+    # # # Method for starting the service
+    async def start(self, host='127.0.0.1', port=8765):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        if self.reload_interval:
+            # Reference to the task is kept (the event loop keeps only weak references to tasks):
+            self.watch_task = asyncio.ensure_future(self.watch())
+            self.watch_task.add_done_callback(self.watch_done)
+        return self.server
+
+    # Method for reporting unexpected end of the reloading task
+    @staticmethod
+    def watch_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error('Reloading of parsed data stopped (%s: %s)', type(task.exception()).__name__,
+                          task.exception())
+
+    # # # Method for running the service until interrupted
+    def serve_forever(self, host='127.0.0.1', port=8765):
+        loop = asyncio.get_event_loop()
+        server = loop.run_until_complete(self.start(host, port))
+        logging.info('Serving on %s', ', '.join(str(s.getsockname()) for s in server.sockets))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.watch_task is not None:
+                self.watch_task.cancel()
+                try:
+                    loop.run_until_complete(self.watch_task)
+                except asyncio.CancelledError:
+                    pass
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+
+    # Method for handling single client connection (HTTP/1.1 with keep-alive)
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                # Read headers (only Connection header is used):
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, {'error': 'Malformed request'}, keep_alive=False)
+                    break
+                method, target, version = parts
+                keep_alive = (headers.get('connection', '').lower() != 'close' and
+                              (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+
+                if method != 'GET':
+                    status, body = 405, {'error': 'Only GET requests are supported'}
+                else:
+                    status, body = await self.dispatch(target)
+                await self.respond(writer, status, body, keep_alive)
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Client disconnected (or sent too long request line)
+            pass
+        finally:
+            writer.close()
+
+    # Method for writing JSON response
+    @staticmethod
+    async def respond(writer, status, body, keep_alive):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   500: 'Internal Server Error'}
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                      'Connection: %s\r\n\r\n' % (status, reasons[status], len(body),
+                                                  'keep-alive' if keep_alive else 'close')).encode() + body)
+        await writer.drain()
+
+    # # # Method for answering request (from response cache, or by running the endpoint handler)
+    async def dispatch(self, target):
+        # target - request target (path and query string)
+        #
+        # Returns HTTP status and response body (bytes)
+
+        url = urllib.parse.urlsplit(target)
+        handler = {'/health': self.health, '/counts': self.counts, '/days': self.days,
+                   '/override': self.override}.get(url.path)
+        if handler is None:
+            return 404, {'error': 'Unknown endpoint: ' + url.path}
+
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        state = self.state
+        key = (state.version, url.path, tuple(sorted(params.items())))
+
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                metrics.incr('service_cache_hits')
+                return 200, self.cache[key]
+        metrics.incr('service_cache_misses')
+
+        # Queries are computed in worker threads (the event loop keeps serving other connections):
+        loop = asyncio.get_event_loop()
+        try:
+            with metrics.span('service.request', endpoint=url.path):
+                body = await loop.run_in_executor(None, handler, state, params)
+        except (KeyError, ValueError, TypeError) as e:
+            return 400, {'error': str(e).strip('"\'')}
+        except Exception as e:
+            logging.exception('Request %s failed', target)
+            return 500, {'error': type(e).__name__}
+
+        body = json.dumps(body).encode()
+        with self.cache_lock:
+            self.cache[key] = body
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return 200, body
+
+    # Method for parsing common query parameters (cities, date range)
+    @staticmethod
+    def parse_selection(state, params):
+        cities = params['cities'].split(',') if params.get('cities') else list(state.dfs)
+        unknown = [city for city in cities if city not in state.dfs]
+        if unknown:
+            raise KeyError('Unknown cities: ' + ', '.join(unknown))
+        return cities, params.get('start'), params.get('end')
+
+    # # # Endpoint: service status
+    @staticmethod
+    def health(state, params):
+        return {'status': 'ok', 'version': state.version, 'cities': list(state.dfs),
+                'days': {city: len(df) for city, df in state.dfs.items()}}
+
+    # # # Endpoint: comfort level counts (from the prefix-sum index)
+    def counts(self, state, params):
+        cities, start, end = self.parse_selection(state, params)
+        months = [int(m) for m in params['months'].split(',')] if params.get('months') else None
+        table = state.index.count_by_city(cities, start, end, months, params.get('criterion'))
+        return {city: {level: int(table.at[level, city]) for level in table.index} for city in cities}
+
+    # # # Endpoint: daily comfort levels of single city
+    @staticmethod
+    def days(state, params):
+        city = params['city']
+        if city not in state.bounds:
+            raise KeyError('Unknown city: ' + city)
+        lo, hi = state.bounds[city]
+        scored = state.scored.score.iloc[lo:hi].sort_index().loc[params.get('start'):params.get('end')]
+        return {'city': city, 'dates': list(scored.index.strftime('%Y-%m-%d')),
+                'levels': scored.values.astype(int).tolist()}
+
+    # # # Endpoint: comfort level counts with overridden comfort limits (e.g. 'temp_1.min=16', 'temp_1.mean=18,26')
+    def override(self, state, params):
+        cities, start, end = self.parse_selection(state, params)
+        override = {key: [float(v) for v in value.split(',')] if ',' in value else float(value)
+                    for key, value in params.items() if '.' in key}
+        if not override:
+            raise ValueError('No comfort limits given (e.g. temp_1.min=16)')
+
+        # Select rows of given cities and date range from the prepared features:
+        f = state.sweeper.features
+        mask = np.isin(f['city'], [f['cities'].index(city) for city in cities])
+        if start is not None:
+            mask &= state.days >= QueryIndex.to_day(start)
+        if end is not None:
+            mask &= state.days <= QueryIndex.to_day(end)
+
+        sweeper = Sweeper(state.analyzer)
+        sweeper.features = {key: value[mask] if isinstance(value, np.ndarray) else value for key, value in f.items()}
+        table = sweeper.sweep(None, [override]).set_index('city')
+
+        return {city: {level: int(table.at[city, level]) for level in ['Great Day', 'Good Day', 'Bad Day']}
+                for city in cities}
@@ -0,0 +1,108 @@
+import pandas as pd
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Mean Earth radius [km]:
+EARTH_RADIUS = 6371.0088
+
+
+class StationRegistry:
+
+    # Method for class initialization:
+    def __init__(self, names, latitudes, longitudes):
+        # names      - list of station (city) names
+        # latitudes  - list of geographical latitudes  [deg]
+        # longitudes - list of geographical longitudes [deg]
+
+        self.names = np.asarray(names, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        # Index stations as points on unit sphere (chord distance is monotonic with great-circle distance):
+        self.points = self.to_xyz(self.latitudes, self.longitudes)
+        self.tree = cKDTree(self.points)
+
+    # # # Method for creating registry of Parser cities
+    @classmethod
+    def from_parser(cls, parser):
+        return cls(parser.cities, parser.latitudes, parser.longitudes)
+
+    # # # Method for converting geographical coordinates to unit sphere points
+    @staticmethod
+    def to_xyz(lat, lon):
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        lon = np.radians(np.asarray(lon, dtype=np.float64))
+        return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+    # # # Method for converting chord lengths (on unit sphere) to great-circle distances [km]
+    @staticmethod
+    def chord_to_km(chord):
+        return 2 * EARTH_RADIUS * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+    # # # Method for converting great-circle distances [km] to chord lengths (on unit sphere)
+    @staticmethod
+    def km_to_chord(dist):
+        return 2 * np.sin(np.minimum(np.asarray(dist, dtype=np.float64) / EARTH_RADIUS, np.pi) / 2)
+
+    # # # Method for finding k nearest stations
+    def nearest(self, lat, lon, k=1):
+        # lat, lon - query coordinates [deg]
+        # k        - number of stations
+        #
+        # Returns DataFrame with station names and haversine distances [km] (sorted by distance)
+
+        k = min(k, len(self.names))
+        point = self.to_xyz(lat, lon)
+
+        chord, idx = self.tree.query(point, k=k)
+        chord, idx = np.atleast_1d(chord), np.atleast_1d(idx)
+
+        return pd.DataFrame({'station': self.names[idx], 'distance': self.chord_to_km(chord)})
+
+    # # # Method for finding all stations within given radius
+    def within(self, lat, lon, radius):
+        # lat, lon - query coordinates [deg]
+        # radius   - search radius [km]
+        #
+        # Returns DataFrame with station names and haversine distances [km] (sorted by distance)
+
+        point = self.to_xyz(lat, lon)
+
+        idx = np.asarray(self.tree.query_ball_point(point, self.km_to_chord(radius)), dtype=np.int64)
+        chord = np.sqrt(((self.points[idx] - point) ** 2).sum(axis=1))
+        order = np.argsort(chord)
+
+        return pd.DataFrame({'station': self.names[idx[order]], 'distance': self.chord_to_km(chord[order])})
+
+    # # # Method for computing distance-weighted comfort counts for arbitrary coordinates
+    def comfort_counts(self, lat, lon, dfs, analyzer, k=3, radius=None, power=2):
+        # lat, lon - query coordinates [deg]
+        # dfs      - dictionary mapping station names to corresponding DataFrames
+        # analyzer - Analyzer instance (its cached batch scores are reused)
+        # k        - number of nearest stations (used when radius is not given)
+        # radius   - search radius [km]
+        # power    - power of inverse distance weighting
+        #
+        # Returns Series with weighted Great/Good/Bad day counts (and DataFrame of used stations)
+
+        stations = self.within(lat, lon, radius) if radius is not None else self.nearest(lat, lon, k)
+        stations = stations[stations.station.isin(list(dfs))].reset_index(drop=True)
+
+        if len(stations) == 0:
+            return pd.Series([np.nan] * 3, index=['Great Day', 'Good Day', 'Bad Day']), stations
+
+        # Comfort counts of all stations (scored once, in batch):
+        positions = {city: j for j, city in enumerate(dfs)}
+        counts = analyzer.count_batch(dfs)[[positions[s] for s in stations.station]]
+
+        # Inverse distance weights (a station at the query point takes all the weight):
+        dist = stations.distance.values
+        if (dist < 1e-6).any():
+            weights = (dist < 1e-6) * 1.0
+        else:
+            weights = 1 / dist ** power
+        weights /= weights.sum()
+        stations['weight'] = weights
+
+        weighted = (counts * weights[:, None]).sum(axis=0)
+        return pd.Series(weighted[::-1], index=['Great Day', 'Good Day', 'Bad Day']), stations
@@ -0,0 +1,197 @@
+import hashlib
+import abc
+import os
+
+import pandas as pd
+
+# PyArrow is imported on first use (it is slow to import and not needed by the rest of the package)
+
+
+class Storage(abc.ABC):
+    # Base class for parsed data storage (one table per city)
+
+    extension = None
+
+    # Method for class initialization:
+    def __init__(self, path):
+        # path - storage directory (or file, for single-file formats)
+        self.path = path
+
+    # Method for creating file path of given city table
+    def city_path(self, city):
+        return os.path.join(self.path, city + self.extension)
+
+    # Method for listing stored cities
+    def cities(self):
+        return sorted(f[:-len(self.extension)] for f in os.listdir(self.path) if f.endswith(self.extension))
+
+    # Method for checking whether the parsed data is stored
+    def exists(self):
+        return os.path.isdir(self.path) and len(self.cities()) > 0
+
+    # Method for getting version of the stored data (latest modification time and list of city tables, so that
+    # saved, added and deleted tables change the version; None - nothing stored)
+    def version(self):
+        if not self.exists():
+            return None
+        files = [self.city_path(city) for city in self.cities()]
+        mtime = max(os.path.getmtime(f) for f in files)
+        return '%r %s' % (mtime, hashlib.sha1('\n'.join(files).encode()).hexdigest()[:12])
+
+    # Method for saving parsed DFs
+    def save(self, dfs):
+        # dfs - dictionary mapping cities to corresponding DataFrames
+        os.makedirs(self.path, exist_ok=True)
+        for city in dfs:
+            self.save_city(dfs[city], city)
+
+    # Method for loading parsed DFs
+    def load(self, cities=None, columns=None):
+        # cities  - list of cities to load (None - all stored cities)
+        # columns - list of columns to load (None - all columns)
+        return {city: self.load_city(city, columns) for city in (cities or self.cities())}
+
+    # Method for saving single city table
+    @abc.abstractmethod
+    def save_city(self, df, city):
+        pass
+
+    # Method for loading single city table
+    @abc.abstractmethod
+    def load_city(self, city, columns=None):
+        pass
+
+
+class ParquetStorage(Storage):
+    # Parquet storage (default) - compressed columnar files, with column projection
+
+    extension = '.parquet'
+
+    def save_city(self, df, city):
+        df.to_parquet(self.city_path(city), engine='pyarrow')
+
+    def load_city(self, city, columns=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Memory-mapped read of selected columns only (index is restored from pandas metadata):
+        table = pq.read_table(pa.memory_map(self.city_path(city)), columns=columns, use_pandas_metadata=True)
+        return table.to_pandas()
+
+    # Method for opening incremental (chunk by chunk) writer of given city table (Parquet storage only)
+    def open_writer(self, city):
+        os.makedirs(self.path, exist_ok=True)
+        return ParquetChunkWriter(self.city_path(city))
+
+
+class ParquetChunkWriter:
+    # Incremental Parquet writer (each written DF is appended as a new row group)
+
+    # Method for class initialization:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+
+    # Method for appending DF chunk
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # First chunk defines the schema of the whole file:
+        if self.writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.file_path, self.schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=True)
+        self.writer.write_table(table)
+        self.rows += len(df)
+
+    # Method for finalizing the file
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FeatherStorage(Storage):
+    # Feather (Arrow IPC) storage - uncompressed columnar files, fastest memory-mapped reads
+
+    extension = '.feather'
+
+    def save_city(self, df, city):
+        # Feather does not store the index, so it is kept as a regular column:
+        df.reset_index().to_feather(self.city_path(city))
+
+    def load_city(self, city, columns=None):
+        import pyarrow as pa
+        import pyarrow.feather as pf
+
+        if columns is not None:
+            columns = ['Date'] + [c for c in columns if c != 'Date']
+        table = pf.read_table(pa.memory_map(self.city_path(city)), columns=columns)
+        return table.to_pandas().set_index('Date')
+
+
+class ExcelStorage(Storage):
+    # Excel storage - single workbook with one sheet per city (kept for exporting only, slow to load)
+
+    extension = '.xlsx'
+
+    def cities(self):
+        return list(pd.ExcelFile(self.path).sheet_names)
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def version(self):
+        return repr(os.path.getmtime(self.path)) if self.exists() else None
+
+    def save(self, dfs):
+        # Initialize Excel writer:
+        writer = pd.ExcelWriter(self.path, engine='xlsxwriter')
+        # Include all cities to the writer:
+        for city in dfs:
+            dfs[city].to_excel(writer, sheet_name=city)
+        # Saved to provided file path:
+        writer.save()
+
+    def load(self, cities=None, columns=None):
+        dfs = pd.read_excel(self.path, sheet_name=cities, index_col='Date')
+        if columns is not None:
+            dfs = {city: dfs[city][columns] for city in dfs}
+        return dict(dfs)
+
+    # Single sheet is saved by rewriting the whole workbook (Excel storage is meant for exporting all cities)
+    def save_city(self, df, city):
+        dfs = self.load() if self.exists() else {}
+        dfs[city] = df
+        self.save(dfs)
+
+    def load_city(self, city, columns=None):
+        return self.load([city], columns)[city]
+
+
+# Supported storage formats and their default paths:
+STORAGES = {'parquet': (ParquetStorage, 'data/updated_meteo_data'),
+            'feather': (FeatherStorage, 'data/updated_meteo_data_feather'),
+            'xlsx': (ExcelStorage, 'data/updated_meteo_data.xlsx')}
+
+
+# Function for creating storage backend of given format
+def get_storage(fmt='parquet', path=None):
+    # fmt  - storage format ('parquet', 'feather' or 'xlsx')
+    # path - storage path (None - default path of given format)
+
+    if fmt not in STORAGES:
+        raise ValueError('Unknown storage format: ' + str(fmt) + ' (expected one of ' + ', '.join(STORAGES) + ')')
+
+    storage_class, default_path = STORAGES[fmt]
+    return storage_class(path or default_path)
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+
+from src.my_schema import decode_column
+
+
+class Summarizer:
+
+    # Method for class initialization:
+    def __init__(self, n_bins=512, grid_size=128):
+        # n_bins    - number of histogram bins of binned KDE
+        # grid_size - number of points of stored density curves
+
+        self.n_bins = n_bins
+        self.grid_size = grid_size
+
+    # # # Method for summarizing single measurement (count, quartiles and KDE density curve)
+    def summarize_values(self, values):
+        # values - NumPy array of measurements (missing values are ignored)
+
+        values = values[~np.isnan(values)]
+        summary = {'count': len(values)}
+
+        if len(values) == 0:
+            summary.update({'min': np.nan, 'max': np.nan, 'q25': np.nan, 'q50': np.nan, 'q75': np.nan,
+                            'grid': np.full(self.grid_size, np.nan), 'density': np.zeros(self.grid_size)})
+            return summary
+
+        v_min, v_max = values.min(), values.max()
+        q25, q50, q75 = np.percentile(values, [25, 50, 75])
+        summary.update({'min': v_min, 'max': v_max, 'q25': q25, 'q50': q50, 'q75': q75})
+
+        grid = np.linspace(v_min, v_max, self.grid_size)
+
+        # Degenerate case (single distinct value):
+        if v_max == v_min:
+            summary.update({'grid': grid, 'density': np.ones(self.grid_size)})
+            return summary
+
+        # Histogram of values (density support is limited to data range, as with cut=0):
+        counts, edges = np.histogram(values, bins=self.n_bins, range=(v_min, v_max))
+        centers = (edges[:-1] + edges[1:]) / 2
+        bin_width = edges[1] - edges[0]
+
+        # Gaussian kernel with Scott's bandwidth (in bins):
+        bw = values.std(ddof=1) * len(values) ** (-1 / 5) if len(values) > 1 else bin_width
+        sigma = max(bw / bin_width, 1e-3)
+        half = int(min(np.ceil(4 * sigma), self.n_bins))
+        kernel = np.exp(-0.5 * (np.arange(-half, half + 1) / sigma) ** 2)
+
+        # Linear convolution of histogram with kernel (via FFT):
+        size = len(counts) + len(kernel) - 1
+        n_fft = 1 << int(np.ceil(np.log2(size)))
+        density = np.fft.irfft(np.fft.rfft(counts, n_fft) * np.fft.rfft(kernel, n_fft), n_fft)
+        density = density[half:half + len(counts)]
+        density = np.clip(density, 0, None)
+        density /= density.sum() * bin_width
+
+        summary.update({'grid': grid, 'density': np.interp(grid, centers, density)})
+        return summary
+
+    # # # Method for summarizing given measurements of all cities
+    def summarize(self, dfs, columns):
+        # dfs     - dictionary mapping cities to corresponding DataFrames
+        # columns - list of measurement columns
+        #
+        # Returns dictionary mapping (city, column) pairs to summaries
+
+        return {(city, col): self.summarize_values(decode_column(dfs[city][col].values, col))
+                for city in dfs for col in columns}
+
+    # # # Method for creating summaries file path of given storage (in its directory, or next to its file)
+    @staticmethod
+    def file_path(storage):
+        if os.path.isfile(storage.path):
+            return os.path.splitext(storage.path)[0] + '_summaries.npz'
+        return os.path.join(storage.path, 'summaries.npz')
+
+    # # # Method for saving summaries (together with version of the summarized data)
+    def save(self, summaries, version, file_path):
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+
+        keys = list(summaries)
+        scalars = ['count', 'min', 'max', 'q25', 'q50', 'q75']
+        np.savez_compressed(file_path,
+                            keys=np.array(keys, dtype=object),
+                            version=np.array([version], dtype=object),
+                            scalars=np.array([[summaries[k][s] for s in scalars] for k in keys], dtype=np.float64),
+                            grids=np.array([summaries[k]['grid'] for k in keys]),
+                            densities=np.array([summaries[k]['density'] for k in keys]))
+
+    # # # Method for loading saved summaries (returns summaries and version, or None if not saved)
+    def load(self, file_path):
+        if not os.path.exists(file_path):
+            return None
+
+        data = np.load(file_path, allow_pickle=True)
+        if 'version' not in data:
+            return None
+        scalars = ['count', 'min', 'max', 'q25', 'q50', 'q75']
+        summaries = {}
+        for k, key in enumerate(data['keys']):
+            summary = dict(zip(scalars, data['scalars'][k]))
+            summary['count'] = int(summary['count'])
+            summary.update({'grid': data['grids'][k], 'density': data['densities'][k]})
+            summaries[tuple(key)] = summary
+
+        return summaries, data['version'][0]
+
+    # # # Method for getting summaries (loaded from file while the stored data is unchanged, otherwise computed)
+    def get(self, dfs, columns, storage=None):
+        # dfs     - dictionary mapping cities to corresponding DataFrames
+        # columns - list of measurement columns
+        # storage - storage the DFs were loaded from, or saved to (summaries are kept next to it, for its current
+        #           version; None - DFs are summarized directly)
+
+        version = storage.version() if storage is not None else None
+        if version is None:
+            return self.summarize(dfs, columns)
+
+        # Saved summaries are reused only for the same version of the stored data:
+        file_path = self.file_path(storage)
+        saved = self.load(file_path)
+        summaries = saved[0] if saved is not None and saved[1] == version else {}
+
+        # Summarize missing measurements (of other cities or columns, or of changed data) and save them:
+        missing = [(city, col) for city in dfs for col in columns if (city, col) not in summaries]
+        if missing:
+            for city, col in missing:
+                summaries[(city, col)] = self.summarize_values(decode_column(dfs[city][col].values, col))
+            self.save(summaries, version, file_path)
+
+        return summaries
@@ -0,0 +1,157 @@
+import itertools
+import copy
+
+import pandas as pd
+import numpy as np
+
+from src.my_analyzer import Analyzer
+
+
+class Sweeper:
+
+    # Conditions of each comfort parameter (feature, comparison, limit key):
+    conditions = {
+        'temp': [('min_temp', '>=', 'min'), ('max_temp', '<=', 'max'), ('swing', '<=', 'delta'),
+                 ('t_mean', '>=', ('mean', 0)), ('t_mean', '<=', ('mean', 1))],
+        'dew': [('dew_min', '>=', 'min'), ('dew_max', '<=', 'max')],
+        'sun': [('sun_perc', '>=', 'min')],
+        'rain': [('rain', '<=', 'max')],
+        'wind': [('wind', '<=', 'max')],
+    }
+
+    # Method for class initialization:
+    def __init__(self, analyzer=None, block_size=65536, max_cells=2 ** 24):
+        # analyzer   - Analyzer instance with the base comfort limits (overridden by sweep configurations)
+        # block_size - number of days evaluated at once
+        # max_cells  - maximum number of (configuration, day) cells evaluated at once (bounds memory)
+
+        self.analyzer = analyzer or Analyzer()
+        self.block_size = block_size
+        self.max_cells = max_cells
+        self.features = None
+
+    # # # Method for precomputing per-day feature arrays of all cities (once per data set)
+    def prepare(self, dfs):
+        # dfs - dictionary mapping cities to corresponding DataFrames
+
+        stacked = self.analyzer.stack_dfs(dfs)
+        a = {col: stacked[col].values.astype(np.float64, copy=False) for col in self.analyzer.columns}
+        t_mean, dew_min, dew_max = self.analyzer.calc_features(a)
+
+        self.features = {'min_temp': a['min_temp'], 'max_temp': a['max_temp'],
+                         'swing': a['max_temp'] - a['min_temp'], 't_mean': t_mean,
+                         'dew_min': dew_min, 'dew_max': dew_max,
+                         'sun_perc': a['sun_perc'], 'rain': a['rain'], 'wind': a['wind'],
+                         'city': stacked.city.cat.codes.values.astype(np.int64),
+                         'cities': list(stacked.city.cat.categories)}
+        return self.features
+
+    # # # Method for creating list of configurations (full sets of comfort limits)
+    def make_configs(self, grid):
+        # grid - dictionary mapping limit names ('temp_1.min', 'wind_2.max', ...) to lists of values
+        #        (all combinations are evaluated), or list of dictionaries mapping limit names to values
+        #
+        # Returns list of limit overrides and list of full limit sets
+
+        if isinstance(grid, dict):
+            names = list(grid)
+            overrides = [dict(zip(names, values)) for values in itertools.product(*[grid[n] for n in names])]
+        else:
+            overrides = list(grid)
+
+        configs = []
+        for override in overrides:
+            limits = {name: copy.deepcopy(getattr(self.analyzer, name)) for name in self.analyzer.limit_names}
+            for key, value in override.items():
+                name, field = key.split('.')
+                if name not in limits or field not in limits[name]:
+                    raise KeyError('Unknown comfort limit: ' + key)
+                limits[name][field] = value
+            configs.append(limits)
+
+        return overrides, configs
+
+    # # # Method for evaluating many configurations of comfort limits
+    def sweep(self, dfs, grid):
+        # dfs  - dictionary mapping cities to corresponding DataFrames (None - reuse prepared features)
+        # grid - configurations (see make_configs)
+        #
+        # Returns tidy DataFrame with day counts per configuration and city
+
+        if dfs is not None:
+            self.prepare(dfs)
+        f = self.features
+
+        overrides, configs = self.make_configs(grid)
+        n_configs = len(configs)
+        n_cities = len(f['cities'])
+
+        # Find unique limit sets of each parameter (shared between configurations):
+        unique = {}
+        for param in self.conditions:
+            keys = [repr((c[param + '_1'], c[param + '_2'])) for c in configs]
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            unique[param] = ([configs[k] for k in first], inverse)
+
+        counts = np.zeros(n_configs * n_cities * 3, dtype=np.int64)
+
+        # Evaluate blocks of days:
+        for start in range(0, len(f['city']), self.block_size):
+            block = {key: f[key][start:start + self.block_size] for key in self.conditions_features()}
+            city = f['city'][start:start + self.block_size]
+
+            # Parameter indicator levels of all unique limit sets (shape [unique sets, days]):
+            levels = {param: self.eval_levels(param, block, unique[param][0]) for param in self.conditions}
+
+            # Combine parameter levels into comfort levels (in bounded chunks of configurations):
+            step = max(1, self.max_cells // max(1, len(city)))
+            for c0 in range(0, n_configs, step):
+                crit = [levels[param][unique[param][1][c0:c0 + step]] for param in self.conditions]
+                total = crit[0] + crit[1] + crit[2] + crit[3] + crit[4]
+                zeros = sum((c == 0).view(np.uint8) for c in crit)
+                x = ((total > (3 * 2 + 2 * 1)) & (zeros == 0)).view(np.uint8)
+                x += ((total > (4 * 1)) & (zeros <= 1)).view(np.uint8)
+
+                # Count comfort levels per configuration and city:
+                idx = (np.arange(len(x))[:, None] * n_cities + city[None, :]) * 3 + x
+                counts[c0 * n_cities * 3:(c0 + len(x)) * n_cities * 3] += np.bincount(
+                    idx.ravel(), minlength=len(x) * n_cities * 3)
+
+        counts = counts.reshape(n_configs, n_cities, 3)
+
+        # Assemble tidy result table (one row per configuration and city):
+        table = pd.DataFrame({'config': np.repeat(np.arange(n_configs), n_cities)})
+        for key in (overrides[0] if overrides else []):
+            values = pd.Series([o[key] if np.isscalar(o[key]) else tuple(o[key]) for o in overrides])
+            table[key] = values.repeat(n_cities).values
+        table['city'] = pd.Categorical.from_codes(np.tile(np.arange(n_cities), n_configs), categories=f['cities'])
+        table['Great Day'] = counts[:, :, 2].ravel()
+        table['Good Day'] = counts[:, :, 1].ravel()
+        table['Bad Day'] = counts[:, :, 0].ravel()
+
+        return table
+
+    # # # Method for listing all features used by conditions
+    def conditions_features(self):
+        return sorted({cond[0] for param in self.conditions for cond in self.conditions[param]})
+
+    # # # Method for evaluating parameter indicator levels for multiple limit sets (broadcasted)
+    def eval_levels(self, param, block, limit_sets):
+        # param      - comfort parameter ('temp', 'dew', 'sun', 'rain' or 'wind')
+        # block      - dictionary mapping features to arrays (block of days)
+        # limit_sets - list of full limit sets (only limits of given parameter are used)
+
+        n_days = len(block[self.conditions[param][0][0]])
+        levels = np.zeros((len(limit_sets), n_days), dtype=np.uint8)
+
+        with np.errstate(invalid='ignore'):
+            for level in ['_1', '_2']:
+                ok = np.ones((len(limit_sets), n_days), dtype=bool)
+                for feature, op, key in self.conditions[param]:
+                    lims = [c[param + level] for c in limit_sets]
+                    th = np.array([lim[key[0]][key[1]] if isinstance(key, tuple) else lim[key] for lim in lims],
+                                  dtype=np.float64)[:, None]
+                    ok &= (block[feature][None, :] >= th) if op == '>=' else (block[feature][None, :] <= th)
+                levels += ok.view(np.uint8)
+
+        return levels